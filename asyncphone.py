@@ -0,0 +1,302 @@
+#
+#  ASYNC:  asyncio data path for FastAPI (SQLAlchemy asyncio + aiosqlite)
+#
+#  The CLI and the GUI keep using the sync API in phone.py.  The model, the validators, the lookup cache
+#  and the change notifications are shared with it:  AsyncSession wraps phone.PhoneSession.
+#
+
+
+import os, asyncio
+
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession as SQLAAsyncSession
+
+import phone as ph
+
+
+# every aiosqlite connection runs on its own thread:  allow enough of them for many concurrent requests
+ASYNC_POOL_SIZE = int(os.environ.get("SQLITE_ASYNC_POOL_SIZE", "20"))
+
+
+# create the async engine on the same database file and with the same pragmas as phone.engine
+def createAsyncDBEngine(path=None, pragmas=None):
+    path = path or ph.DB_PATH
+    pragmas = ph.SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    newEngine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=ASYNC_POOL_SIZE, max_overflow=ASYNC_POOL_SIZE)
+
+    # connection events are fired by the sync engine inside the async one
+    @event.listens_for(newEngine.sync_engine, "connect")
+    def setPragmas(dbapi_connection, connection_record):
+        ph.applyPragmas(dbapi_connection, pragmas)
+
+    if ph.QUERY_STATS:
+        ph.instrumentEngine(newEngine.sync_engine)
+
+    return newEngine
+
+
+# async sessions without a bind use the shared async engine (created on first use, see getAsyncEngine)
+class PhoneAsyncSession(SQLAAsyncSession):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=getAsyncEngine() if bind is None else bind, **kwargs)
+
+
+# Setup:  like phone.py, importing this module does no I/O and loads no driver
+
+asyncEngine = None
+AsyncSession = async_sessionmaker(class_=PhoneAsyncSession, expire_on_commit=False, sync_session_class=ph.PhoneSession)
+
+
+# the shared async engine, created on first use (one event loop thread:  no lock needed)
+def getAsyncEngine():
+    global asyncEngine
+    if asyncEngine is None:
+        asyncEngine = createAsyncDBEngine()
+    return asyncEngine
+
+
+# point the async data path at another engine (a test or benchmark database)
+def useAsyncEngine(newEngine):
+    global asyncEngine
+    asyncEngine = newEngine
+
+
+# unit of work:  async with transaction() as session:  ...  same rules as phone.transaction
+@asynccontextmanager
+async def transaction(session=None):
+    # the caller already has a session:  join it, the caller commits
+    if session is not None:
+        yield session
+        await session.flush()
+        return
+
+    async with AsyncSession() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+# one page of phones, see phone.getPhonesPage
+async def getPhonesPage(afterID=None, limit=ph.DEFAULT_PAGE_SIZE, filters=None, order="asc", includeArchived=False,
+                        sort="id", fields=None, session=None):
+    """
+    Get one page of phones after the cursor afterID (and of the archived ones with includeArchived),
+    filtered, sorted and with only some fields like phone.getPhonesPage.
+    Return:  (phones as phone.PhoneRow tuples or dicts of fields, next cursor or None when this is the last page)
+    """
+
+    stmt = ph.pageStatement(afterID, limit, filters, order, sort=sort, fields=fields)
+
+    async with transaction(session) as session:
+        phones = ph.pageRows(await session.execute(stmt), fields)
+
+        if includeArchived:
+            archiveStmt = ph.pageStatement(afterID, limit, filters, order, ph.PhoneArchive, sort, fields)
+            phones = ph.mergePages(phones, ph.pageRows(await session.execute(archiveStmt), fields), limit, order, sort)
+
+    return ph.splitPage(phones, limit, sort, fields)
+
+
+# look one phone up through the shared lookup cache, see phone.getPhoneRecord
+async def getPhoneRecord(field, value, includeArchived=False, session=None):
+    """
+    Get a phone by one of the phone.LOOKUP_FIELDS (or an archived one too with includeArchived).
+    Return:  the phone as a dict, None if not found
+    """
+
+    stmt = ph.lookupStatement(field, value)
+
+    key = (field, value)
+    record = ph.phoneCache.get(key)
+    if record is not None:
+        return record
+
+    generation = ph.phoneCache.generation
+    async with transaction(session) as session:
+        phone = (await session.scalars(stmt)).first()
+        if not phone:
+            if includeArchived:
+                phone = (await session.scalars(ph.lookupStatement(field, value, ph.PhoneArchive))).first()
+                return ph.phoneRecord(phone) if phone else None
+            return None
+        record = ph.phoneRecord(phone)
+
+    ph.phoneCache.put(key, record, generation)
+    return dict(record)
+
+
+# look many phones up at once through the shared lookup cache, see phone.lookupMany
+async def lookupMany(keys, includeArchived=False, session=None):
+    """
+    Get phones by lists of phone.LOOKUP_FIELDS values:  {"imei": [...], "id": [...], ...}
+    Return:  {field: {value: the phone as a dict, None if not found}} for every field and value asked for
+    """
+
+    results = ph.cachedLookups(keys)
+
+    generation = ph.phoneCache.generation
+    async with transaction(session) as session:
+        for field, stmt in ph.lookupManyStatements(ph.notFound(results)):
+            ph.addLookups(results, field, await session.execute(stmt), generation)
+
+        if includeArchived:
+            for field, stmt in ph.lookupManyStatements(ph.notFound(results), ph.PhoneArchive):
+                ph.addLookups(results, field, await session.execute(stmt))
+
+    return results
+
+
+# ranked full-text search, see phone.searchPhones
+async def searchPhones(query, limit=20, session=None):
+    """
+    Search phones by any part of their brand, model, serial number, IMEI or workstation.
+    Return:  a list of phones as dicts, best match first
+    """
+
+    stmt = ph.searchStatement(query, limit)
+    if stmt is None:
+        return []
+
+    async with transaction(session) as session:
+        result = await session.execute(stmt)
+        return [dict(row._mapping) for row in result]
+
+
+# fleet totals from the summary tables, see phone.fleetStats
+async def fleetStats(session=None):
+    """
+    Count phones by status, by (status, brand, OS, OS version) and by (workstation, status).
+    Return:  {"total": n, "by_status": {...}, "groups": [{...}, ...], "workstations": [{...}, ...]}
+    """
+
+    groupStmt, workstationStmt = ph.statsStatements()
+
+    async with transaction(session) as session:
+        groupRows = (await session.execute(groupStmt)).all()
+        workstationRows = (await session.execute(workstationStmt)).all()
+
+    return ph.summarizeStats(groupRows, workstationRows)
+
+
+# pull only what changed since a sequence number, see phone.changesSince
+async def changesSince(seq=0, limit=ph.DEFAULT_CHANGES_LIMIT, session=None):
+    """
+    Get the changes to phones after sequence number seq, oldest first.
+    Return:  {"changes": [...], "last_seq": n, "more": bool, "resync": bool}
+    """
+
+    changesStmt, boundsStmt = ph.changesStatements(seq, limit)
+
+    async with transaction(session) as session:
+        rows = (await session.execute(changesStmt)).all()
+        bounds = (await session.execute(boundsStmt)).one()
+
+    return ph.summarizeChanges(seq, limit, rows, bounds)
+
+
+# the version of the whole phone table, see phone.tableVersion
+async def tableVersion(session=None):
+    """
+    Get the newest change to "phone".
+    Return:  (sequence number, ISO 8601 UTC time of the change), (0, None) for a database that never changed
+    """
+
+    async with transaction(session) as session:
+        row = (await session.execute(ph.tableVersionStatement())).first()
+    return tuple(row) if row else (0, None)
+
+
+# the version of one phone, see phone.phoneVersion
+async def phoneVersion(phoneID, session=None):
+    """
+    Get the version of phone phoneID.
+    Return:  (version, ISO 8601 UTC time of the last change), None if not found
+    """
+
+    async with transaction(session) as session:
+        row = (await session.execute(ph.phoneVersionStatement(phoneID))).first()
+    return tuple(row) if row else None
+
+
+# a phone with its version from one read, see phone.getVersionedPhone
+async def getVersionedPhone(phoneID, session=None):
+    """
+    Get phone phoneID and its version.
+    Return:  (the phone as a dict, version, ISO 8601 UTC time of the last change), None if not found
+    """
+
+    async with transaction(session) as session:
+        return ph.versionedRecord((await session.execute(ph.versionedPhoneStatement(phoneID))).first())
+
+
+# add a phone from a dict of details (capitalized like every other path)
+async def addPhone(details, session=None):
+    """
+    Add a phone.
+    Return:  the new phone as a dict; raises IntegrityError for a duplicate serial number or IMEI
+    """
+
+    phone = ph.Phone(**details)
+    ph.capPhoneDetails(phone)
+
+    async with transaction(session) as session:
+        session.add(phone)
+        await session.flush()
+        record = ph.phoneRecord(phone)
+
+    return record
+
+
+# update some details of a phone
+async def updatePhone(phoneID, updates, session=None):
+    """
+    Update the given details of phone phoneID.
+    Return:  the updated phone as a dict, None if not found
+    """
+
+    async with transaction(session) as session:
+        phone = await session.get(ph.Phone, phoneID)
+        if not phone:
+            return None
+
+        for detail, value in updates.items():
+            setattr(phone, detail, value)
+
+        ph.capPhoneDetails(phone)
+        await session.flush()
+        record = ph.phoneRecord(phone)
+
+    return record
+
+
+# delete a phone by its ID
+async def deletePhone(phoneID, session=None):
+    """
+    Delete phone phoneID.
+    Return:  True for successful deletion, False if not found
+    """
+
+    async with transaction(session) as session:
+        phone = await session.get(ph.Phone, phoneID)
+        if not phone:
+            return False
+
+        await session.delete(phone)
+
+    return True
+
+
+# queue a sync write (phone.addPhoneRecord, ...) for the next group commit without blocking the event loop
+async def submitWrite(fn, *args):
+    """
+    Run fn(*args) in phone.groupCommitter's next batch.
+    Return:  what fn returns; raises what fn raises (IntegrityError for a duplicate, ...)
+    """
+
+    return await asyncio.wrap_future(ph.groupCommitter.submit(fn, *args))
@@ -0,0 +1,885 @@
+#
+#  Benchmarks:  Workstation Phone Management
+#
+
+howtorun = r"""
+
+#
+# HOWTO:
+#
+# python benchphone.py <benchmark> [rows]
+#
+# every benchmark runs against a throw away database in a temp directory, never phones.db
+#
+
+# tuned engine (WAL, synchronous=NORMAL, cache, mmap, ...) vs the old create_engine defaults
+python benchphone.py engine 2000
+
+# stream the fleet out as csv/ndjson/json, then load it with query(Phone).all() like viewPhones, report rows/s and peak RSS
+python benchphone.py export 1000000
+
+# latency of one page at increasing depths:  keyset (WHERE id > cursor) vs LIMIT/OFFSET
+python benchphone.py paging 1000000
+
+# duplicate checks per second:  SELECT per check (old validateIMEI) vs the Bloom filter + set index
+python benchphone.py unique 100000
+
+# concurrency stress:  many threads adding and looking up phones through phone.transaction(), exits with 1 on any error
+python benchphone.py stress 16 200
+
+# load test:  500 concurrent clients against a sync (def) and an async (async def) endpoint, p50/p99 and requests/s
+python benchphone.py async 500 10
+
+# FTS5 trigram search latency (serial fragment, IMEI suffix, model) vs LIKE '%...%' scans
+python benchphone.py search 1000000
+
+# EXPLAIN QUERY PLAN for every FastAPI lookup and report filter, exits with 1 if any of them SCANs the table
+python benchphone.py plans
+
+# online backup of a 200k phone database (4 MB steps, then one step) with a writer committing phones the whole
+# time:  backup MB/s and restarts, writer p50/p99 commit latency with and without the backup running
+python benchphone.py backup 200000
+
+# writes/s with one transaction per write vs group commit, at 1, 8, 32 and 128 concurrent writers, with the default
+# synchronous=NORMAL and with synchronous=FULL (an fsync per commit), 2000 writes per run
+python benchphone.py groupcommit 2000
+
+# read-only listings:  full ORM Phone instances vs PhoneRow tuples, memory per phone and latency for the whole
+# fleet and for 100-phone pages
+python benchphone.py rows 100000
+python benchphone.py rows 1000000
+
+# GET of the whole fleet:  query + PhoneRead + JSON encoding per request vs the pre-encoded snapshot (plain and gzip),
+# at 1%, 10% and 100% of the rows
+python benchphone.py snapshot 100000
+
+# JSON for 1k, 10k and 100k phones:  response_model=List[PhoneRead] validation vs the rows encoded as is
+# (phone.dumpsJSON:  orjson when installed), encoding alone and the whole GET through FastAPI
+python benchphone.py json 100000
+
+# resolve 500 scanned IMEIs (1 in 10 unknown) in a 100k phone fleet with a cold lookup cache:  one lookup per IMEI
+# vs phone.lookupMany (IN (...) queries of LOOKUP_CHUNK_SIZE values), sync and async
+python benchphone.py lookup 100000 500
+
+# startup:  python -X importtime for phone.py (no engine, no database file) and time to first response of every
+# front end (median of 5 runs), exits with 1 if any of them goes over its STARTUP_BUDGETS_MS
+python benchphone.py startup 5
+
+"""
+
+
+import os, sys, json, time, tempfile, threading, random, resource, asyncio, statistics, subprocess, importlib.util, tracemalloc
+
+from sqlalchemy import text, select
+from sqlalchemy.orm import sessionmaker
+
+import phone as ph
+
+
+# Helpers:
+# --------
+
+# the details of a unique, valid test phone for row n
+def phoneDetails(n):
+    return {
+        "brand": "SAMSUNG",
+        "model": ["S22", "S23", "S24", "FOLD5", "FLIP5"][n % 5],
+        "os": "ANDROID",
+        "os_version": "18",
+        "serial_number": f"BENCH-SN-{n:08d}",
+        "imei": f"BENCH-IMEI-{n:08d}",
+        "status": "ACTIVE",
+        "workstation": f"WS{n % 500:04d}"
+    }
+
+
+# build a unique, valid test phone for row n
+def makePhone(n):
+    return ph.Phone(**phoneDetails(n))
+
+
+# insert rows test phones quickly with executemany, chunkSize rows per transaction
+def fillBenchDB(benchEngine, rows, chunkSize=10000):
+    for start in range(0, rows, chunkSize):
+        with benchEngine.begin() as conn:
+            conn.execute(ph.Phone.__table__.insert(), [phoneDetails(n) for n in range(start, min(start + chunkSize, rows))])
+
+
+# peak resident memory of this process so far in MB (ru_maxrss is KB on Linux)
+def peakRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# create an engine and the "phone" table on a new database file in a temp directory
+def makeBenchDB(tmpdir, name, pragmas=None):
+    path = os.path.join(tmpdir, f"{name}.db")
+    benchEngine = ph.createDBEngine(path, pragmas)
+    ph.Base.metadata.create_all(benchEngine)
+    return benchEngine
+
+
+# fastapiphone.PhoneRead as it is declared there (importing fastapiphone needs its JWT settings)
+def phoneReadModel():
+    from pydantic import BaseModel
+
+    class PhoneRead(BaseModel):
+        id: int
+        brand: str
+        model: str
+        os: str
+        os_version: str
+        serial_number: str
+        imei: str
+        status: str
+        workstation: str
+
+        class Config:
+            orm_mode = True
+
+    return PhoneRead
+
+
+# print one result line
+def report(label, count, seconds):
+    rate = count / seconds if seconds else float("inf")
+    print(f"{label:<40} {count:>9} ops  {seconds:>8.3f} s  {rate:>12,.0f} ops/s")
+
+
+# Benchmarks:
+# -----------
+
+# write (one commit per phone like addPhone) and read (lookup by IMEI) throughput, default vs tuned engine
+def benchEngine(rows=2000):
+    configs = {
+        "default": {},  # what create_engine('sqlite:///phones.db') used to give us
+        "tuned": ph.SQLITE_PRAGMAS
+    }
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, pragmas in configs.items():
+            benchEngine = makeBenchDB(tmpdir, name, pragmas)
+            BenchSession = sessionmaker(bind=benchEngine)
+
+            # writes:  one transaction per phone
+            start = time.perf_counter()
+            for n in range(rows):
+                with BenchSession() as s:
+                    s.add(makePhone(n))
+                    s.commit()
+            report(f"[{name}] single-row commits", rows, time.perf_counter() - start)
+
+            # reads:  random lookups by IMEI
+            start = time.perf_counter()
+            with BenchSession() as s:
+                for _ in range(rows):
+                    n = random.randrange(rows)
+                    s.query(ph.Phone).filter_by(imei=f"BENCH-IMEI-{n:08d}").first()
+            report(f"[{name}] lookups by IMEI", rows, time.perf_counter() - start)
+
+            # mixed:  4 writers and 4 readers at the same time, count "database is locked" failures
+            errors = []
+            perThread = max(rows // 8, 1)
+
+            def writer(offset):
+                for n in range(offset, offset + perThread):
+                    try:
+                        with BenchSession() as s:
+                            s.add(makePhone(n))
+                            s.commit()
+                    except Exception as e:
+                        errors.append(e)
+
+            def reader():
+                with BenchSession() as s:
+                    for _ in range(perThread):
+                        n = random.randrange(rows)
+                        s.query(ph.Phone).filter_by(imei=f"BENCH-IMEI-{n:08d}").first()
+
+            threads = [threading.Thread(target=writer, args=(rows * 2 + i * perThread,)) for i in range(4)]
+            threads += [threading.Thread(target=reader) for _ in range(4)]
+
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            report(f"[{name}] 4 writers + 4 readers", perThread * 8, time.perf_counter() - start)
+            print(f"[{name}] lock errors: {len(errors)}\n")
+
+            benchEngine.dispose()
+
+
+# streaming export vs loading every ORM object first; peak RSS is a high-water mark so the old path runs last
+def benchExport(rows=1000000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "export")
+        fillBenchDB(benchEngine, rows)
+        print(f"{rows:,} phones, peak RSS after filling: {peakRSS():,.0f} MB\n")
+
+        for fmt in ["csv", "ndjson", "json"]:
+            start = time.perf_counter()
+            with open(os.devnull, "w") as out:
+                for text in ph.iterExport(fmt, targetEngine=benchEngine):
+                    out.write(text)
+            report(f"[stream] export {fmt}", rows, time.perf_counter() - start)
+            print(f"[stream] peak RSS: {peakRSS():,.0f} MB")
+
+        # what viewPhones and GET /phones do today
+        BenchSession = sessionmaker(bind=benchEngine)
+        start = time.perf_counter()
+        with BenchSession() as s, open(os.devnull, "w") as out:
+            for phone in s.query(ph.Phone).all():
+                out.write(repr(phone))
+        report("[all()] load then write", rows, time.perf_counter() - start)
+        print(f"[all()] peak RSS: {peakRSS():,.0f} MB")
+
+        benchEngine.dispose()
+
+
+# one page of 100 phones at increasing depths, keyset pagination vs OFFSET
+def benchPaging(rows=1000000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "paging")
+        fillBenchDB(benchEngine, rows)
+        BenchSession = sessionmaker(bind=benchEngine)
+        firstID = 1  # a new table starts at 1
+
+        with BenchSession() as s:
+            for depth in [0, rows // 100, rows // 10, rows // 2, rows - 200]:
+                start = time.perf_counter()
+                s.query(ph.Phone).order_by(ph.Phone.id).offset(depth).limit(100).all()
+                offsetTime = time.perf_counter() - start
+                s.expunge_all()
+
+                start = time.perf_counter()
+                s.query(ph.Phone).filter(ph.Phone.id > firstID + depth - 1).order_by(ph.Phone.id).limit(100).all()
+                keysetTime = time.perf_counter() - start
+                s.expunge_all()
+
+                print(f"depth {depth:>9,}:  OFFSET {offsetTime * 1000:>8.2f} ms   keyset {keysetTime * 1000:>8.2f} ms")
+
+        benchEngine.dispose()
+
+
+# duplicate-check throughput, half new values and half existing ones
+def benchUnique(rows=100000, checks=20000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "unique")
+        fillBenchDB(benchEngine, rows)
+        BenchSession = sessionmaker(bind=benchEngine)
+
+        values = [f"BENCH-IMEI-{random.randrange(rows * 2):08d}" for _ in range(checks)]
+
+        # before:  one SELECT per check
+        start = time.perf_counter()
+        with BenchSession() as s:
+            for imei in values:
+                s.query(ph.Phone).filter_by(imei=imei).first() is not None
+        report("[query] validateIMEI", checks, time.perf_counter() - start)
+
+        # after:  in-memory index, the first check pays for the load
+        for mode in ["local", "shared"]:
+            index = ph.UniqueIndex(benchEngine, mode)
+
+            start = time.perf_counter()
+            index.contains("imei", values[0])
+            print(f"[{mode}] index load: {(time.perf_counter() - start) * 1000:,.1f} ms for {rows:,} phones")
+
+            start = time.perf_counter()
+            for imei in values:
+                index.contains("imei", imei)
+            report(f"[{mode}] UniqueIndex.contains", checks, time.perf_counter() - start)
+
+        benchEngine.dispose()
+
+
+# threads adding phones and reading them back through phone.py's own API; every result is checked
+def benchStress(threads=16, perThread=200):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "stress")
+        ph.useEngine(benchEngine)
+        errors = []
+
+        def worker(t):
+            for i in range(perThread):
+                n = t * perThread + i
+                imei = f"BENCH-IMEI-{n:08d}"
+                try:
+                    with ph.transaction() as session:
+                        session.add(makePhone(n))
+
+                    if not ph.validateIMEI(imei):
+                        errors.append(f"validateIMEI missed {imei}")
+                    if not ph.getPhoneRecord("imei", imei):
+                        errors.append(f"getPhoneRecord missed {imei}")
+
+                    # someone else's phone, it may or may not exist yet
+                    other = random.randrange(threads * perThread)
+                    ph.getPhoneRecord("serial_number", f"BENCH-SN-{other:08d}")
+                    ph.getPhonesPage(limit=20)
+                except Exception as e:
+                    errors.append(repr(e))
+
+        workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        report(f"{threads} threads x {perThread} add+lookups", threads * perThread, time.perf_counter() - start)
+
+        with ph.transaction() as session:
+            count = session.query(ph.Phone).count()
+        if count != threads * perThread:
+            errors.append(f"expected {threads * perThread} phones, found {count}")
+
+        print(f"cache: {ph.cacheStats()}")
+        benchEngine.dispose()
+
+    if errors:
+        print(f"\nERROR:  {len(errors)} failures, first ones:")
+        for error in errors[:10]:
+            print(f"  {error}")
+        sys.exit(1)
+
+
+# the same page endpoint served by phone.py (sync def, threadpool) and asyncphone.py (async def, event loop)
+def benchAsync(clients=500, requestsPerClient=10, rows=10000):
+    import httpx
+    from fastapi import FastAPI
+    import asyncphone as aph
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "async")
+        fillBenchDB(benchEngine, rows)
+        ph.useEngine(benchEngine)
+        aph.useAsyncEngine(aph.createAsyncDBEngine(os.path.join(tmpdir, "async.db")))
+
+        syncApp = FastAPI()
+        asyncApp = FastAPI()
+
+        @syncApp.get("/phones")
+        def syncPage(cursor: int = 0):
+            phones, _ = ph.getPhonesPage(afterID=cursor, limit=20)
+            return [ph.phoneRecord(phone) for phone in phones]
+
+        @asyncApp.get("/phones")
+        async def asyncPage(cursor: int = 0):
+            phones, _ = await aph.getPhonesPage(afterID=cursor, limit=20)
+            return [ph.phoneRecord(phone) for phone in phones]
+
+        async def load(app):
+            latencies = []
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+                async def oneClient():
+                    for _ in range(requestsPerClient):
+                        start = time.perf_counter()
+                        response = await client.get("/phones", params={"cursor": random.randrange(rows)})
+                        latencies.append(time.perf_counter() - start)
+                        assert response.status_code == 200
+
+                start = time.perf_counter()
+                await asyncio.gather(*[oneClient() for _ in range(clients)])
+                return latencies, time.perf_counter() - start
+
+        for name, app in [("sync", syncApp), ("async", asyncApp)]:
+            latencies, seconds = asyncio.run(load(app))
+            cuts = statistics.quantiles(latencies, n=100)
+            print(f"[{name:>5}] {clients} clients:  p50 {cuts[49] * 1000:>8.1f} ms   p99 {cuts[98] * 1000:>8.1f} ms   "
+                  f"{len(latencies) / seconds:>8,.0f} req/s")
+
+        asyncio.run(aph.asyncEngine.dispose())
+        benchEngine.dispose()
+
+
+# search latency on a large fleet:  phone.searchPhones vs the LIKE scan it replaces
+def benchSearch(rows=1000000):
+    queries = ["SN-0012345", "IMEI-0000999", "FOLD5 WS0043", "99999"]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "search")
+        fillBenchDB(benchEngine, rows)
+
+        start = time.perf_counter()
+        ph.migrateDB(benchEngine)
+        print(f"search index built for {rows:,} phones in {time.perf_counter() - start:,.1f} s\n")
+        ph.useEngine(benchEngine)
+
+        with benchEngine.connect() as conn:
+            for query in queries:
+                start = time.perf_counter()
+                found = ph.searchPhones(query, limit=20)
+                ftsTime = time.perf_counter() - start
+
+                term = query.split()[0]
+                start = time.perf_counter()
+                conn.execute(text(
+                    "SELECT * FROM phone WHERE serial_number LIKE :term OR imei LIKE :term OR model LIKE :term "
+                    "OR workstation LIKE :term LIMIT 20"
+                ), {"term": f"%{term}%"}).all()
+                likeTime = time.perf_counter() - start
+
+                print(f"{query!r:<16} {len(found):>3} hits   FTS5 {ftsTime * 1000:>8.2f} ms   LIKE {likeTime * 1000:>8.2f} ms")
+
+        benchEngine.dispose()
+
+
+# the WHERE clauses of the FastAPI lookup endpoints and the status/brand/OS filters
+LOOKUP_QUERIES = {
+    "getPhoneByID":          lambda q: q.filter(ph.Phone.id == 1000),
+    "getPhoneByIMEI":        lambda q: q.filter(ph.Phone.imei == "BENCH-IMEI-00000001"),
+    "getPhoneBySerial":      lambda q: q.filter(ph.Phone.serial_number == "BENCH-SN-00000001"),
+    "getPhoneByWorkstation": lambda q: q.filter(ph.Phone.workstation == "WS0001"),
+    "status filter":         lambda q: q.filter(ph.Phone.status == "ACTIVE"),
+    "brand/OS report":       lambda q: q.filter(ph.Phone.brand == "SAMSUNG", ph.Phone.os == "ANDROID", ph.Phone.os_version == "18")
+}
+
+# the filtered, sorted and projected pages of GET /phones (a later page, so the cursor seek is in the plan too)
+PAGE_QUERIES = {
+    "OS filter page":        lambda: ph.pageStatement(1000, 100, {"os": "IOS", "os_version": "17"}),
+    "workstation prefix":    lambda: ph.pageStatement(1000, 100, {"workstation_prefix": "WS01"}, fields=["id", "imei"]),
+    "sort by workstation":   lambda: ph.pageStatement(("WS0100", 1000), 100, None, sort="workstation"),
+    "sort by status, desc":  lambda: ph.pageStatement(("ACTIVE", 1000), 100, None, "desc", sort="status")
+}
+
+
+# query plan regression check:  fail if any lookup or page falls back to a full table SCAN
+def benchPlans():
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "plans")
+        ph.migrateDB(benchEngine)
+        BenchSession = sessionmaker(bind=benchEngine)
+
+        # no ANALYZE:  the check is about which indexes the schema offers, not the current data distribution
+        with BenchSession() as s:
+            statements = [(name, applyFilter(s.query(ph.Phone)).statement) for name, applyFilter in LOOKUP_QUERIES.items()]
+            statements += [(name, makeStatement()) for name, makeStatement in PAGE_QUERIES.items()]
+
+            for name, stmt in statements:
+                sql = str(stmt.compile(benchEngine, compile_kwargs={"literal_binds": True}))
+                plan = [row[-1] for row in s.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+                # "SCAN phone" is a full table scan, "SCAN phone USING (COVERING) INDEX" still uses an index
+                # ("SCAN anon_1" reads the few rows of a subquery)
+                scans = [step for step in plan if step.startswith("SCAN phone") and "INDEX" not in step]
+                if scans:
+                    failures.append(name)
+
+                print(f"{'FAIL' if scans else 'OK':<5} {name:<24} {' | '.join(plan)}")
+
+        benchEngine.dispose()
+
+    if failures:
+        print(f"\nERROR:  full table scan in: {', '.join(failures)}")
+        sys.exit(1)
+
+
+# backup throughput, and what a running backup does to the commit latency of a concurrent writer
+def benchBackup(rows=200000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "backup")
+        ph.migrateDB(benchEngine)
+        fillBenchDB(benchEngine, rows)
+        ph.useEngine(benchEngine)
+
+        stop = threading.Event()
+        latencies = []
+        nextPhone = [rows]
+
+        # one phone per commit, like addPhone
+        def writer():
+            while not stop.is_set():
+                start = time.perf_counter()
+                with ph.transaction() as session:
+                    session.add(makePhone(nextPhone[0]))
+                latencies.append((time.perf_counter() - start) * 1000)
+                nextPhone[0] += 1
+
+        def writerLatency(label, seconds=None, during=None):
+            latencies.clear()
+            stop.clear()
+            thread = threading.Thread(target=writer)
+            thread.start()
+            result = during() if during else time.sleep(seconds)
+            stop.set()
+            thread.join()
+
+            cuts = statistics.quantiles(latencies, n=100)
+            print(f"{label:<40} {len(latencies):>6} commits  p50 {cuts[49]:>7.2f} ms  p99 {cuts[98]:>7.2f} ms")
+            return result
+
+        writerLatency("writer alone", seconds=2)
+
+        for pages in [1024, -1]:
+            dest = os.path.join(tmpdir, f"copy{pages}.db")
+            result = writerLatency(f"writer during backup ({pages} pages/step)", during=lambda: ph.backup(dest, pages))
+            print(f"{'':<40} backup {result['bytes'] / 1e6:.1f} MB in {result['seconds']} s  {result['mb_per_sec']} MB/s  "
+                  f"{result['steps']} steps  {result['restarts']} restarts  integrity {result['integrity']}")
+
+        result = ph.backup(os.path.join(tmpdir, "copy.db.gz"))
+        print(f"{'gzip backup, no writer':<40} {result['bytes'] / 1e6:.1f} MB in {result['seconds']} s  "
+              f"-> {os.path.getsize(result['dest']) / 1e6:.1f} MB")
+
+        benchEngine.dispose()
+
+
+# concurrent writers adding phones through phone.writePhone, one transaction each vs group commit
+def benchGroupCommit(writes=2000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for synchronous in ["NORMAL", "FULL"]:
+            for grouped in [False, True]:
+                for concurrency in [1, 8, 32, 128]:
+                    name = f"gc-{synchronous}-{grouped}-{concurrency}"
+                    benchEngine = makeBenchDB(tmpdir, name, dict(ph.SQLITE_PRAGMAS, synchronous=synchronous))
+                    ph.migrateDB(benchEngine)
+                    ph.useEngine(benchEngine)
+                    ph.GROUP_COMMIT = grouped
+                    ph.groupCommitter = ph.GroupCommitter()
+                    errors = []
+
+                    def worker(t):
+                        for n in range(t, writes, concurrency):
+                            try:
+                                ph.writePhone(ph.addPhoneRecord, phoneDetails(n))
+                            except Exception as e:
+                                errors.append(repr(e))
+
+                    workers = [threading.Thread(target=worker, args=(t,)) for t in range(concurrency)]
+                    start = time.perf_counter()
+                    for w in workers:
+                        w.start()
+                    for w in workers:
+                        w.join()
+
+                    mode = "group commit" if grouped else "own transaction"
+                    report(f"{synchronous:<6} {mode:<15} {concurrency:>3} writers", writes, time.perf_counter() - start)
+                    if grouped:
+                        stats = ph.groupCommitter.stats()
+                        print(f"{'':<40} {stats['batches']} batches, {stats['writes'] / max(stats['batches'], 1):.1f} writes per batch")
+                    if errors:
+                        print(f"ERROR:  {len(errors)} failed writes, first:  {errors[0]}")
+
+                    benchEngine.dispose()
+
+        ph.GROUP_COMMIT = False
+
+
+# memory and latency of listing phones as ORM instances (the old read path) vs PhoneRow tuples
+def benchRows(rows=100000, pageSize=100, pages=200):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "rows")
+        fillBenchDB(benchEngine, rows)
+        ph.useEngine(benchEngine)
+        BenchSession = sessionmaker(bind=benchEngine)
+
+        # the old getPhonesPage:  select(Phone) into a Session
+        def ormList(limit, afterID=None):
+            with BenchSession() as s:
+                return s.scalars(ph.pageStatement(afterID, limit).with_only_columns(ph.Phone)).all()
+
+        def rowList(limit, afterID=None):
+            with benchEngine.connect() as conn:
+                return ph.phoneRows(conn.execute(ph.pageStatement(afterID, limit)))
+
+        for label, listPhones in [("ORM Phone instances", ormList), ("PhoneRow tuples", rowList)]:
+            # the whole fleet at once:  latency, then memory held per phone
+            start = time.perf_counter()
+            phones = listPhones(rows)
+            seconds = time.perf_counter() - start
+            del phones
+
+            tracemalloc.start()
+            phones = listPhones(rows)
+            held, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del phones
+
+            report(f"{label}, whole fleet", rows, seconds)
+            print(f"{'':<40} {held / rows:>9.0f} bytes per phone held")
+
+            # pages at random depths, like the web front ends
+            start = time.perf_counter()
+            for _ in range(pages):
+                listPhones(pageSize, random.randrange(rows))
+            seconds = time.perf_counter() - start
+            print(f"{'':<40} {seconds / pages * 1000:>9.3f} ms per {pageSize}-phone page\n")
+
+        benchEngine.dispose()
+
+
+# the whole fleet per request:  query + PhoneRead + JSON encoding every time vs the pre-encoded snapshot
+def benchSnapshot(rows=100000, requests=50):
+    import httpx
+    from typing import List
+    from fastapi import FastAPI, Request, Response
+
+    PhoneRead = phoneReadModel()
+    app = FastAPI()
+
+    @app.get("/encoded", response_model=List[PhoneRead])
+    def encoded():
+        return [phone._asdict() for phone in ph.iterPhones(limit=1000)]
+
+    @app.get("/snapshot")
+    def snapshot(request: Request):
+        encoding, body, etag = ph.snapshotBody(ph.phoneSnapshot.current(), request.headers.get("accept-encoding"))
+        headers = {"ETag": etag} if encoding == "identity" else {"ETag": etag, "Content-Encoding": encoding}
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def load(path, count, headers):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            for _ in range(count):
+                response = await client.get(path, headers=headers)
+                assert response.status_code == 200
+            return (time.perf_counter() - start) / count, response.num_bytes_downloaded
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in [rows // 100, rows // 10, rows]:
+            benchEngine = ph.createDBEngine(os.path.join(tmpdir, f"snapshot{size}.db"))
+            ph.migrateDB(benchEngine)
+            fillBenchDB(benchEngine, size)
+            ph.useEngine(benchEngine)
+
+            build = ph.phoneSnapshot.rebuild()
+            print(f"{size:>9} phones:  snapshot built in {build.seconds:.3f} s, "
+                  + ", ".join(f"{encoding} {len(body) / 1e6:.1f} MB" for encoding, body in build.bodies.items()))
+
+            for label, path, headers, count in [
+                ("query + PhoneRead + JSON", "/encoded", {}, max(requests // 10, 3)),
+                ("snapshot", "/snapshot", {"Accept-Encoding": "identity"}, requests),
+                ("snapshot, gzip (+ client gunzip)", "/snapshot", {"Accept-Encoding": "gzip"}, requests)
+            ]:
+                seconds, size_ = asyncio.run(load(path, count, headers))
+                print(f"  {label:<34} {seconds * 1000:>10.2f} ms per request  {size_ / 1e6:>8.1f} MB sent")
+
+            benchEngine.dispose()
+
+
+# JSON for n phones:  response_model=List[PhoneRead] (validate + copy every phone) vs phone.dumpsJSON of the rows
+def benchJSON(rows=100000, requests=20):
+    import httpx
+    from typing import List
+    from fastapi import FastAPI, Response
+    from pydantic import TypeAdapter
+
+    PhoneRead = phoneReadModel()
+    adapter = TypeAdapter(List[PhoneRead])
+
+    class PhoneJSONResponse(Response):
+        media_type = "application/json"
+
+        def render(self, content):
+            return ph.dumpsJSON(content)
+
+    for size in [rows // 100, rows // 10, rows]:
+        phones = [ph.PhoneRow(n, *phoneDetails(n).values()) for n in range(size)]
+        print(f"{size:>9} phones  (encoder:  {'orjson' if ph.orjson else 'json'})")
+
+        # encoding only, no HTTP
+        for label, encode in [
+            ("PhoneRead validate + dump_json", lambda: adapter.dump_json(adapter.validate_python(phones, from_attributes=True))),
+            ("phoneDicts + dumpsJSON", lambda: ph.dumpsJSON(ph.phoneDicts(phones)))
+        ]:
+            runs = max(requests, 3)
+            start = time.perf_counter()
+            for _ in range(runs):
+                body = encode()
+            seconds = (time.perf_counter() - start) / runs
+            print(f"  {label:<36} {seconds * 1000:>10.2f} ms  {len(body) / 1e6:>7.1f} MB")
+
+        # the whole endpoint through FastAPI
+        app = FastAPI()
+
+        @app.get("/validated", response_model=List[PhoneRead])
+        async def validated():
+            return phones
+
+        @app.get("/fast", response_model=List[PhoneRead])
+        async def fast():
+            return PhoneJSONResponse(ph.phoneDicts(phones))
+
+        async def load(path):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                start = time.perf_counter()
+                for _ in range(requests):
+                    response = await client.get(path)
+                    assert response.status_code == 200
+                return (time.perf_counter() - start) / requests, response.content
+
+        (slow, slowBody), (quick, quickBody) = asyncio.run(load("/validated")), asyncio.run(load("/fast"))
+        assert json.loads(slowBody) == json.loads(quickBody)
+        print(f"  {'GET, response_model validation':<36} {slow * 1000:>10.2f} ms")
+        print(f"  {'GET, PhoneJSONResponse':<36} {quick * 1000:>10.2f} ms  ({slow / quick:.1f}x)\n")
+
+
+# many IMEIs at once:  one getPhoneRecord per IMEI vs lookupMany, sync and async, with a cold lookup cache
+def benchLookup(rows=100000, scans=500):
+    import asyncphone as aph
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchEngine = makeBenchDB(tmpdir, "lookup")
+        fillBenchDB(benchEngine, rows)
+        ph.useEngine(benchEngine)
+        aph.useAsyncEngine(aph.createAsyncDBEngine(os.path.join(tmpdir, "lookup.db")))
+
+        # a scanning station's batch:  random phones, every tenth IMEI unknown
+        imeis = [f"BENCH-IMEI-{random.randrange(rows):08d}" if n % 10 else f"UNKNOWN-{n}" for n in range(scans)]
+
+        def oneByOne():
+            return {imei: ph.getPhoneRecord("imei", imei) for imei in imeis}
+
+        async def oneByOneAsync():
+            return {imei: await aph.getPhoneRecord("imei", imei) for imei in imeis}
+
+        for label, lookup in [
+            ("getPhoneRecord per IMEI", oneByOne),
+            ("lookupMany", lambda: ph.lookupMany({"imei": imeis})["imei"]),
+            ("async getPhoneRecord per IMEI", lambda: asyncio.run(oneByOneAsync())),
+            ("async lookupMany", lambda: asyncio.run(aph.lookupMany({"imei": imeis}))["imei"])
+        ]:
+            ph.phoneCache.clear()
+            start = time.perf_counter()
+            found = lookup()
+            report(label, scans, time.perf_counter() - start)
+            assert sum(phone is not None for phone in found.values()) == len({imei for imei in imeis if imei.startswith("BENCH")})
+
+        asyncio.run(aph.asyncEngine.dispose())
+        benchEngine.dispose()
+
+
+# each front end from a cold interpreter to its first answer:  (module it needs, script)
+STARTUP_SCRIPTS = {
+    "cli": (None, "import phone; phone.getPhonesPage(limit=1)"),
+    "flask": ("flask", "import flaskphone; assert flaskphone.app.test_client().get('/').status_code == 200"),
+    "fastapi": ("fastapi", "\n".join([
+        "import sys; sys.path.insert(0, 'fastapi')",
+        "import fastapiphone as f",
+        "from fastapi.testclient import TestClient",
+        "c = TestClient(f.app)",
+        "token = c.post('/login', data={'username': f.ADMIN, 'password': f.PW}).json()['access_token']",
+        "assert c.get('/phones?limit=1', headers={'Authorization': 'Bearer ' + token}).status_code == 200"
+    ])),
+    "gui": ("PyQt6", "\n".join([
+        "from PyQt6.QtWidgets import QApplication",
+        "app = QApplication([])",
+        "import gui2",
+        "window = gui2.MainWindow()",
+        "window.show_view_all_phones()"
+    ]))
+}
+
+# regression thresholds in ms:  the import alone, and the median time to first response per front end
+STARTUP_BUDGETS_MS = {
+    "import phone": 600,
+    "cli": 1200,
+    "flask": 1800,
+    "fastapi": 3000,
+    "gui": 3000
+}
+
+
+# import cost of phone.py, then the time to first response of every front end, against STARTUP_BUDGETS_MS
+def benchStartup(runs=5):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ, SQLITE_DB_PATH=os.path.join(tmpdir, "startup.db"), QT_QPA_PLATFORM="offscreen")
+
+        # 1. importing phone.py:  no engine and no database file, and how long it takes
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import phone; assert phone.dbEngine is None"],
+            cwd=repo, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0 or os.path.exists(env["SQLITE_DB_PATH"]):
+            print(result.stderr[-2000:])
+            print("FAIL  importing phone.py created the engine or the database file")
+            failures.append("import phone")
+
+        # "import time: self [us] | cumulative | imported package":  the slowest top level imports
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            parts = line.split("|")
+            if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+                name = parts[2].rstrip()
+                if not name.startswith("  "):
+                    cumulative[name.strip()] = int(parts[1]) / 1000
+
+        for name, ms in sorted(cumulative.items(), key=lambda item: -item[1])[:5]:
+            print(f"importtime {name:<30} {ms:>8.1f} ms")
+
+        importMS = cumulative.get("phone", 0)
+        if importMS > STARTUP_BUDGETS_MS["import phone"]:
+            failures.append("import phone")
+        print(f"{'import phone':<41} {importMS:>8.1f} ms  (budget {STARTUP_BUDGETS_MS['import phone']} ms)\n")
+
+        # 2. a small database for the first responses
+        benchEngine = ph.createDBEngine(env["SQLITE_DB_PATH"])
+        ph.migrateDB(benchEngine)
+        fillBenchDB(benchEngine, 1000)
+        benchEngine.dispose()
+
+        for frontEnd, (module, script) in STARTUP_SCRIPTS.items():
+            if module and importlib.util.find_spec(module) is None:
+                print(f"{frontEnd:<10} skipped:  {module} is not installed")
+                continue
+
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                result = subprocess.run([sys.executable, "-c", script], cwd=repo, env=env, capture_output=True, text=True)
+                times.append((time.perf_counter() - start) * 1000)
+
+                if result.returncode != 0:
+                    print(result.stderr[-2000:])
+                    break
+
+            budget = STARTUP_BUDGETS_MS[frontEnd]
+            median = statistics.median(times)
+            ok = result.returncode == 0 and median <= budget
+            if not ok:
+                failures.append(frontEnd)
+
+            print(f"{'OK' if ok else 'FAIL':<5} {frontEnd:<10} first response  median {median:>8.1f} ms  "
+                  f"min {min(times):>8.1f} ms  (budget {budget} ms)")
+
+    if failures:
+        print(f"\nERROR:  startup over budget or broken: {', '.join(failures)}")
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    "engine": benchEngine,
+    "export": benchExport,
+    "async": benchAsync,
+    "paging": benchPaging,
+    "search": benchSearch,
+    "stress": benchStress,
+    "unique": benchUnique,
+    "plans": benchPlans,
+    "startup": benchStartup,
+    "backup": benchBackup,
+    "groupcommit": benchGroupCommit,
+    "rows": benchRows,
+    "snapshot": benchSnapshot,
+    "json": benchJSON,
+    "lookup": benchLookup
+}
+
+
+# main
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(howtorun)
+        print(f"Benchmarks: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+
+    args = [int(a) for a in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*args)
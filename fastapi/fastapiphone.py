@@ -21,21 +21,52 @@ howtorun = r"""
 Use curl to test endpoints.  Do not have to use Postman or Swagger/docs!
 
 
-# get all phones
+# get all phones, 100 per page (the next page's URL is in the Link header, add -i to see it)
 curl http://127.0.0.1:8000/phones
+curl "http://127.0.0.1:8000/phones?cursor=1099&limit=100"
+
+# only ACTIVE iOS 17 phones in lab WS10, by workstation, and only their ID, IMEI and workstation
+curl "http://127.0.0.1:8000/phones?status=active&os=ios&os_version=17&workstation_prefix=ws10&sort=workstation&fields=id,imei,workstation"
+
+# get the whole fleet in one response (pre-encoded, rebuilt after writes; --compressed asks for gzip)
+curl --compressed http://127.0.0.1:8000/phones/all
 
 # get phone by ID
 curl http://127.0.0.1:8000/phones/id/1000
 
+# poll without downloading it again:  304 Not Modified until it changes (same for /phones)
+curl -i -H 'If-None-Match: "phone-1000-1"' http://127.0.0.1:8000/phones/id/1000
+
 # get phone by IMEI, "imei":"998877665544332211-1016"
 curl http://127.0.0.1:8000/phones/imei/998877665544332211-1016
 
+# look many phones up in one request, each value gets its phone or null
+curl -X POST http://127.0.0.1:8000/phones/lookup -H "Content-Type: application/json" -d '{"ids": [1000, 1001], "imeis": ["998877665544332211-1016"]}'
+
 # get phone by serial number, "serial_number":"AA556677BB-1022"
 curl http://127.0.0.1:8000/phones/serial_number/AA556677BB-1022
 
 # get phone by workstation, "workstation":"WS1023"
 curl http://127.0.0.1:8000/phones/workstation/WS1023
 
+# search phones by part of a serial number, IMEI, model, ... (3+ characters per term)
+curl "http://127.0.0.1:8000/phones/search?q=FOLD"
+
+# every phone including the archived ones (RETIRED long ago, see python phone.py archive)
+curl "http://127.0.0.1:8000/phones?include_archived=true"
+
+# changes since the last_seq of the previous call (resync: true means reload everything)
+curl "http://127.0.0.1:8000/phones/changes?since=0"
+
+# import phones from a CSV or NDJSON file (needs a token from /login)
+curl -H "Authorization: Bearer <token>" -F "file=@phones.csv" http://127.0.0.1:8000/import
+
+# metrics for Prometheus (text format)
+curl http://127.0.0.1:8000/metrics
+
+# export all phones as csv, ndjson or json (streamed, needs a token from /login)
+curl -H "Authorization: Bearer <token>" "http://127.0.0.1:8000/export?format=ndjson"
+
 # OR
 #
 # you could go to:  http://127.0.0.1:8000/docs
@@ -43,16 +74,22 @@ curl http://127.0.0.1:8000/phones/workstation/WS1023
 """
 
 
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session as SQLASession
+import io, os
+
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from typing import List
+from typing import List, Dict
 
 from pydantic import BaseModel
 
 #from phone import Base, engine, Session, Phone, capPhoneDetails, seedTestPhones
 
 import phone as ph
+import asyncphone as aph
+import metrics
 
 
 # JWT:  JSON Web Token
@@ -138,13 +175,49 @@ class PhoneRead(BaseModel):
         orm_mode = True
 
 
-# create a session to the DB
-def getDB():
-    db_session = ph.Session()
-    try:
+# PhoneLookup class for the batch lookup endpoint:
+# ################################################
+
+class PhoneLookup(BaseModel):
+    ids: List[int] = []
+    imeis: List[str] = []
+    serial_numbers: List[str] = []
+    workstations: List[str] = []
+
+
+# every value asked for, with its phone or null when not found
+class PhoneLookupResult(BaseModel):
+    ids: Dict[str, PhoneRead | None] = {}
+    imeis: Dict[str, PhoneRead | None] = {}
+    serial_numbers: Dict[str, PhoneRead | None] = {}
+    workstations: Dict[str, PhoneRead | None] = {}
+
+
+# Fast JSON:  phones read from the database already have PhoneRead's fields and types, so the read endpoints send
+# them encoded as is (orjson when installed, see phone.dumpsJSON) instead of validating and copying each one through
+# PhoneRead again; response_model still documents them in /docs.  PHONE_FAST_JSON=off validates like before
+FAST_JSON = os.environ.get("PHONE_FAST_JSON", "on") == "on"
+
+
+class PhoneJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return ph.dumpsJSON(content)
+
+
+# the response of a read endpoint:  the trusted phones (a list or one record) encoded straight to JSON
+def phoneResponse(content, response, headers=None):
+    if not FAST_JSON:
+        response.headers.update(headers or {})
+        return content
+    return PhoneJSONResponse(ph.phoneDicts(content) if isinstance(content, list) else content, headers=headers)
+
+
+# create an async session to the DB (endpoints are async, see asyncphone.py; the CLI and GUI stay sync)
+async def getDB():
+    async with aph.AsyncSession() as db_session:
         yield db_session
-    finally:
-        db_session.close()
 
 
 # delete all phones 
@@ -161,12 +234,15 @@ def deleteAllPhones():
 # ###############################################
 
 app = FastAPI()
+
+# request counts and latency per route for /metrics
+app.add_middleware(metrics.ASGIMetrics)
     
     
 # setup the database 
 @app.on_event("startup")
 def setupDB():
-    ph.Base.metadata.create_all(ph.engine)
+    ph.migrateDB()
 
     db_session = ph.Session()
 
@@ -204,120 +280,307 @@ def login(username: str = Form(...), password: str = Form(...)):
     return {"access_token": token, "token_type": "bearer"}
 
 
-# VIEW ALL phones endpoint
+# VIEW ALL phones endpoint, one page at a time:  the next page's URL is in the Link header
+MAX_PAGE_SIZE = 1000
+
 @app.get("/phones", response_model=List[PhoneRead])
-def getPhones(db: SQLASession = Depends(getDB), token: dict = Depends(requireToken)):
-    return db.query(ph.Phone).all()
+async def getPhones(request: Request,
+                    response: Response,
+                    cursor: str | None = None, 
+                    limit: int = Query(ph.DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                    order: str = "asc",
+                    include_archived: bool = False,
+                    status: str | None = None,
+                    brand: str | None = None,
+                    os_name: str | None = Query(None, alias="os"),
+                    os_version: str | None = None,
+                    workstation: str | None = None,
+                    workstation_prefix: str | None = None,
+                    sort: str = Query("id", description=f"One of {ph.PAGE_SORTS}, then by id"),
+                    fields: str | None = Query(None, description="Comma separated columns to return, e.g. id,imei,workstation"),
+                    db: AsyncSession = Depends(getDB),
+                    token: dict = Depends(requireToken)):
+    # nothing changed since the client's copy:  304 without reading a phone (the version is read before the page,
+    # so a write in between only makes the next poll fetch again)
+    seq, changedAt = await aph.tableVersion(session=db)
+    etag = ph.tableETag(seq)
+    validators = ph.validatorHeaders(etag, changedAt)
+    if ph.notModified(etag, changedAt, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=validators)
+
+    # filters are capitalized like the stored details; the WHERE, ORDER BY and column list are all done in SQL
+    filters = {detail: value.upper() for detail, value in [
+        ("status", status), ("brand", brand), ("os", os_name), ("os_version", os_version),
+        ("workstation", workstation), ("workstation_prefix", workstation_prefix)
+    ] if value is not None}
+    columns = [field.strip() for field in fields.split(",") if field.strip()] if fields is not None else None
 
+    try:
+        phones, next_cursor = await aph.getPhonesPage(afterID=ph.decodeCursor(cursor, sort), limit=limit, filters=filters,
+                                                      order=order, includeArchived=include_archived, sort=sort,
+                                                      fields=columns, session=db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-# VIEW one phone by ID
+    headers = dict(validators)
+    if next_cursor is not None:
+        next_cursor = ph.encodeCursor(next_cursor)
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+        headers["X-Next-Cursor"] = str(next_cursor)
+
+    # only some fields:  not a PhoneRead, so never validated against it (PHONE_FAST_JSON or not)
+    if columns is not None:
+        return PhoneJSONResponse(phones, headers=headers)
+    return phoneResponse(phones, response, headers)
+
+
+# VIEW ALL phones at once:  the whole fleet from phone.py's pre-encoded snapshot, as is (gzip or brotli when the
+# client accepts it); the snapshot is rebuilt in the background after writes, so the cost doesn't grow with the fleet
+@app.get("/phones/all", response_model=List[PhoneRead])
+async def getAllPhones(request: Request, token: dict = Depends(requireToken)):
+    seq, _ = await aph.tableVersion()
+    ph.phoneSnapshot.checkVersion(seq)  # another process wrote:  rebuild soon, serve this one meanwhile
+    snapshot = ph.phoneSnapshot.snapshot or await run_in_threadpool(ph.phoneSnapshot.current)
+
+    encoding, body, etag = ph.snapshotBody(snapshot, request.headers.get("accept-encoding"))
+    headers = ph.validatorHeaders(etag, snapshot.changed_at)
+    headers["Vary"] = "Accept-Encoding"
+    if ph.notModified(etag, snapshot.changed_at,
+                      request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# SEARCH phones by any part of the brand, model, serial number, IMEI or workstation:  /phones/search?q=FOLD
+@app.get("/phones/search", response_model=List[PhoneRead])
+async def searchPhones(response: Response,
+                       q: str = Query(..., min_length=3), 
+                       limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                       db: AsyncSession = Depends(getDB),
+                       token: dict = Depends(requireToken)):
+    return phoneResponse(await aph.searchPhones(q, limit, session=db), response)
+
+
+# CHANGE FEED:  only what changed after ?since=<last_seq of the previous call>, deletes as tombstones
+@app.get("/phones/changes")
+async def getPhoneChanges(since: int = Query(0, ge=0),
+                          limit: int = Query(ph.DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+                          db: AsyncSession = Depends(getDB),
+                          token: dict = Depends(requireToken)):
+    return await aph.changesSince(since, limit, session=db)
+
+
+# fleet summary:  counts by status, brand/OS/version and workstation (kept up to date by triggers)
+@app.get("/phones/stats")
+async def getFleetStats(token: dict = Depends(requireToken)):
+    return await aph.fleetStats()
+
+
+# VIEW one phone by ID, with its ETag and Last-Modified:  If-None-Match / If-Modified-Since get a 304
+# ?include_archived=true also finds phones moved to the archive (see phone.archiveRetiredPhones)
 @app.get("/phones/id/{phoneID}", response_model=PhoneRead)
-def getPhoneByID(phoneID: int, db: SQLASession =Depends(getDB), token: dict = Depends(requireToken)):
-    phone = db.query(ph.Phone).filter(ph.Phone.id == phoneID).first()
+async def getPhoneByID(phoneID: int,
+                       request: Request,
+                       response: Response,
+                       include_archived: bool = False,
+                       token: dict = Depends(requireToken)):
+    ifNoneMatch = request.headers.get("if-none-match")
+    ifModifiedSince = request.headers.get("if-modified-since")
+
+    # a conditional GET only reads the phone's version
+    if ifNoneMatch or ifModifiedSince:
+        version = await aph.phoneVersion(phoneID)
+        if version:
+            etag, updatedAt = ph.phoneETag(phoneID, version[0]), version[1]
+            if ph.notModified(etag, updatedAt, ifNoneMatch, ifModifiedSince):
+                return Response(status_code=304, headers=ph.validatorHeaders(etag, updatedAt))
+
+    found = await aph.getVersionedPhone(phoneID)
+    if found:
+        phone, version, updatedAt = found
+        return phoneResponse(phone, response, ph.validatorHeaders(ph.phoneETag(phoneID, version), updatedAt))
+
+    # archived phones don't change:  no validators
+    phone = await aph.getPhoneRecord("id", phoneID, includeArchived=include_archived) if include_archived else None
     if not phone:
         raise HTTPException(status_code=404, detail=f"Phone with {phoneID} not found!")
 
     # the phone is found, return it
-    return phone
+    return phoneResponse(phone, response)
 
 
 # VIEW one phone by IMEI
 @app.get("/phones/imei/{imei}", response_model=PhoneRead)
-def getPhoneByIMEI(imei: str, db: SQLASession = Depends(getDB), token: dict = Depends(requireToken)):
-    phone = db.query(ph.Phone).filter(ph.Phone.imei == imei.upper()).first()
+async def getPhoneByIMEI(imei: str, response: Response, include_archived: bool = False,
+                         token: dict = Depends(requireToken)):
+    phone = await aph.getPhoneRecord("imei", imei.upper(), includeArchived=include_archived)
     if not phone:
         raise HTTPException(status_code=404, detail=f"Phone with IMEI {imei} not found!")
-    return phone
+    return phoneResponse(phone, response)
 
 
 # VIEW one phone by Serial Number
 @app.get("/phones/serial_number/{serial_number}", response_model=PhoneRead)
-def getPhoneBySerial(serial_number: str, db: SQLASession = Depends(getDB), token: dict = Depends(requireToken)):
-    phone = db.query(ph.Phone).filter(ph.Phone.serial_number == serial_number.upper()).first()
+async def getPhoneBySerial(serial_number: str, response: Response, include_archived: bool = False,
+                           token: dict = Depends(requireToken)):
+    phone = await aph.getPhoneRecord("serial_number", serial_number.upper(), includeArchived=include_archived)
     if not phone:
         raise HTTPException(status_code=404, detail=f"Phone with serial number {serial_number} not found!")
-    return phone
+    return phoneResponse(phone, response)
 
 
 # VIEW one phone by Workstation
 @app.get("/phones/workstation/{workstation}", response_model=PhoneRead)
-def getPhoneByWorkstation(workstation: str, db: SQLASession = Depends(getDB), token: dict = Depends(requireToken)):
-    phone = db.query(ph.Phone).filter(ph.Phone.workstation == workstation.upper()).first()
+async def getPhoneByWorkstation(workstation: str, response: Response, include_archived: bool = False,
+                                token: dict = Depends(requireToken)):
+    phone = await aph.getPhoneRecord("workstation", workstation.upper(), includeArchived=include_archived)
     if not phone:
         raise HTTPException(status_code=404, detail=f"Phone at workstation {workstation} not found!")
-    return phone
+    return phoneResponse(phone, response)
+
+
+# LOOKUP many phones in one request (barcode scanning stations):  one IN (...) query per key type, cached ones
+# from the lookup cache; the answer has every value sent, as sent, with its phone or null
+MAX_LOOKUP_KEYS = 10000
+
+# PhoneLookup fields and the phone.LOOKUP_FIELDS they look up
+LOOKUP_KEYS = {"ids": "id", "imeis": "imei", "serial_numbers": "serial_number", "workstations": "workstation"}
+
+@app.post("/phones/lookup", response_model=PhoneLookupResult)
+async def lookupPhones(lookup: PhoneLookup, response: Response, include_archived: bool = False,
+                       token: dict = Depends(requireToken)):
+    keys = {name: getattr(lookup, name) for name in LOOKUP_KEYS}
+    count = sum(len(values) for values in keys.values())
+    if count > MAX_LOOKUP_KEYS:
+        raise HTTPException(status_code=400, detail=f"{count} values to look up, the most is {MAX_LOOKUP_KEYS}.")
+
+    # the values are capitalized like the single lookups; the answer is keyed by the values as sent
+    found = await aph.lookupMany({LOOKUP_KEYS[name]: [value if name == "ids" else value.upper() for value in values]
+                                  for name, values in keys.items()}, includeArchived=include_archived)
+
+    results = {}
+    for name, values in keys.items():
+        phones = found[LOOKUP_KEYS[name]]
+        results[name] = {str(value): phones[value if name == "ids" else value.upper()] for value in values}
+
+    return phoneResponse(results, response)
+
+
+# lookup cache counters:  hits, misses, evictions, ...
+@app.get("/cache/stats")
+async def getCacheStats(token: dict = Depends(requireToken)):
+    return ph.cacheStats()
+
+
+# Prometheus scrape:  requests, latency, DB statements and pools, lookup cache, fleet size
+# (a plain def:  the gauges read the database, FastAPI runs it on its thread pool)
+@app.get("/metrics", include_in_schema=False)
+def getMetrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # ADD a phone endpoint
 @app.post("/add", response_model=PhoneRead)
-def addPhone(newphone: PhoneCreate, 
-             db: SQLASession = Depends(getDB), 
-             token: dict = Depends(requireToken)):
-
-    phone = ph.Phone(
-        brand=newphone.brand,
-        model=newphone.model,
-        os=newphone.os,
-        os_version=newphone.os_version,
-        serial_number=newphone.serial_number.upper(),
-        imei=newphone.imei.upper(),
-        status=newphone.status,
-        workstation=newphone.workstation.upper()
-    )
-
-    # capitalize for uniformity
-    ph.capPhoneDetails(phone)
+async def addPhone(newphone: PhoneCreate, 
+                   db: AsyncSession = Depends(getDB), 
+                   token: dict = Depends(requireToken)):
 
+    # capitalized for uniformity inside aph.addPhone; with PHONE_GROUP_COMMIT=on it is committed with other writes
     try:
-        db.add(phone)
-        db.commit()
-        db.refresh(phone)
+        if ph.GROUP_COMMIT:
+            phone = await aph.submitWrite(ph.addPhoneRecord, newphone.dict())
+        else:
+            phone = await aph.addPhone(newphone.dict(), db)
+            await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
     return phone
 
 
+# IMPORT phones in bulk from an uploaded CSV or NDJSON file
+@app.post("/import")
+def importPhones(file: UploadFile = File(...), 
+                 format: str | None = None, 
+                 batch_size: int = 500, 
+                 token: dict = Depends(requireToken)):
+
+    fmt = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    
+    # the upload is read and inserted one chunk at a time, never loaded into memory as a whole
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    
+    try:
+        return ph.importPhones(stream, fmt, batchSize=batch_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+
+
+# EXPORT all phones, streamed one batch at a time so memory stays flat for any fleet size
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
+
+@app.get("/export")
+def exportPhones(format: str = "csv", token: dict = Depends(requireToken)):
+    fmt = format.lower()
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown export format {format}.  Use csv, ndjson or json.")
+
+    return StreamingResponse(
+        ph.iterExport(fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="phones.{fmt}"'}
+    )
+
+
 # UPDATE a phone endpoint
 @app.put("/update/id/{phoneID}", response_model=PhoneRead)
-def updatePhoneByID(phoneID: int, update: PhoneUpdate, db: SQLASession  = Depends(getDB), token: dict = Depends(requireToken)):
-    phone = db.query(ph.Phone).filter(ph.Phone.id == phoneID).first()
-    
-    if not phone:
-        raise HTTPException(status_code=404, detail=f"Phone ID {phoneID} not found")
+async def updatePhoneByID(phoneID: int, update: PhoneUpdate, db: AsyncSession = Depends(getDB), token: dict = Depends(requireToken)):
 
-    # apply only updated details of a phone:  the fields/attributes (id, brand, model, ...)
+    # apply only updated details of a phone:  the fields/attributes (id, brand, model, ...), capitalized inside
     updates = update.dict(exclude_unset=True)
-    for detail, value in updates.items():
-        setattr(phone, detail, value)
-
-    # capitalize for uniformity
-    ph.capPhoneDetails(phone)
 
     try:
-        db.commit()
-        db.refresh(phone)
+        if ph.GROUP_COMMIT:
+            phone = await aph.submitWrite(ph.updatePhoneRecord, phoneID, updates)
+        else:
+            phone = await aph.updatePhone(phoneID, updates, db)
+            await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+    
+    if not phone:
+        raise HTTPException(status_code=404, detail=f"Phone ID {phoneID} not found")
 
     return phone
     
     
 # DELETE a phone endpoint
 @app.delete("/delete/id/{phoneID}")
-def deletePhoneByID(phoneID: int, db: SQLASession  = Depends(getDB), token: dict = Depends(requireToken)):
-    phone = db.query(ph.Phone).filter(ph.Phone.id == phoneID).first()
+async def deletePhoneByID(phoneID: int, db: AsyncSession = Depends(getDB), token: dict = Depends(requireToken)):
+    if ph.GROUP_COMMIT:
+        deleted = await aph.submitWrite(ph.deletePhoneRecord, phoneID)
+    else:
+        deleted = await aph.deletePhone(phoneID, db)
 
-    if not phone:
+    if not deleted:
         raise HTTPException(
             status_code=404,
             detail=f"Phone ID {phoneID} not found."
         )
 
-    db.delete(phone)
-    db.commit()
+    await db.commit()
 
     return {"message": f"Phone ID {phoneID} deleted successfully!"}
 
@@ -1,5 +1,6 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, make_response
 import phone as ph
+import metrics
 
 
 #
@@ -18,7 +19,7 @@ howtorun = r'''
 #
 # ENDPOINTS:
 #
-# 1.  view all phones, home (/):  http://localhost:5000/
+# 1.  view all phones, home (/):  http://localhost:5000/  (next page:  http://localhost:5000/?cursor=1099&limit=100)
 #
 # 2.  view one phone ID:  http://localhost:5000/phone_id
 #
@@ -26,12 +27,24 @@ howtorun = r'''
 #
 # 4.  add a phone:  http://localhost:5000/add
 #
+# 5.  search phones:  http://localhost:5000/search?q=FOLD
+#
+# 6.  changes since a sequence number (JSON):  http://localhost:5000/phones/changes?since=0
+#
+# 7.  metrics for Prometheus (text format):  http://localhost:5000/metrics
+#
 
 '''
 
 
 app = Flask(__name__)
 app.secret_key = "devkey"   # required for flash messages
+metrics.instrumentFlask(app)   # request counts and latency per route for /metrics
+
+# bring an older phones.db up to date once at startup (change log, versions, search index, ...), like FastAPI's setupDB
+ph.migrateDB()
+
+MAX_PAGE_SIZE = 1000   # upper bound for ?limit= on the phone list
 
 
 # get a DB session
@@ -50,10 +63,53 @@ def get_db():
 
 @app.route("/")
 def index():
-    session = ph.Session()
-    phones = session.query(ph.Phone).all()
-    session.close()
-    return render_template("index.html", phones=phones)
+    # one page at a time:  /?cursor=<last phone ID of the previous page>&limit=100
+    cursor = request.args.get("cursor", type=int)
+    limit = max(1, min(request.args.get("limit", ph.DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+    # nothing changed since the browser's copy:  304 without reading a phone
+    seq, changed_at = ph.tableVersion()
+    etag = ph.tableETag(seq)
+    if not_modified(etag, changed_at):
+        return Response(status=304, headers=ph.validatorHeaders(etag, changed_at))
+
+    phones, next_cursor = ph.getPhonesPage(afterID=cursor, limit=limit)
+    response = make_response(render_template("index.html", phones=phones, next_cursor=next_cursor, limit=limit))
+    response.headers.update(ph.validatorHeaders(etag, changed_at))
+    return response
+
+
+# the If-None-Match / If-Modified-Since of this request still match
+def not_modified(etag, changed_at):
+    return ph.notModified(etag, changed_at, request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since"))
+
+
+# search phones:  any part of the brand, model, serial number, IMEI or workstation
+# ################################################
+
+@app.route("/search")
+def search():
+    query = request.args.get("q", "").strip()
+    phones = ph.searchPhones(query, limit=MAX_PAGE_SIZE) if query else []
+    return render_template("index.html", phones=phones, next_cursor=None, limit=ph.DEFAULT_PAGE_SIZE, query=query)
+
+
+# change feed (JSON):  only what changed after ?since=<last_seq of the previous call>
+# ################################################
+
+@app.route("/phones/changes")
+def phone_changes():
+    since = max(request.args.get("since", 0, type=int), 0)
+    limit = max(1, min(request.args.get("limit", ph.DEFAULT_CHANGES_LIMIT, type=int), MAX_PAGE_SIZE))
+    return jsonify(ph.changesSince(since, limit))
+
+
+# metrics for Prometheus (text format)
+# ################################################
+
+@app.route("/metrics")
+def metrics_text():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
 
 
 # view one phone
@@ -61,15 +117,29 @@ def index():
 
 @app.route("/phone/<int:phone_id>")
 def view_phone(phone_id):
-    session = ph.Session()
-    phone = session.query(ph.Phone).filter_by(id=phone_id).first()
-    session.close()
+    # a conditional GET only reads the phone's version
+    if request.headers.get("If-None-Match") or request.headers.get("If-Modified-Since"):
+        version = ph.phoneVersion(phone_id)
+        if version:
+            etag, updated_at = ph.phoneETag(phone_id, version[0]), version[1]
+            if not_modified(etag, updated_at):
+                return Response(status=304, headers=ph.validatorHeaders(etag, updated_at))
 
-    if not phone:
+    found = ph.getVersionedPhone(phone_id)  # the phone and the version its ETag names, from one read
+
+    if not found:
         flash(f"Phone ID {phone_id} not found")
         return redirect(url_for("index"))
 
-    return render_template("view_phone.html", phone=phone)
+    phone, version, updated_at = found
+    response = make_response(render_template("view_phone.html", phone=phone))
+    response.headers.update(ph.validatorHeaders(ph.phoneETag(phone_id, version), updated_at))
+    return response
+
+
+# the phone details posted by the add and update forms
+def phone_form_details():
+    return {detail: request.form[detail] for detail in ph.IMPORT_COLUMNS}
 
 
 # add a phone
@@ -78,34 +148,16 @@ def view_phone(phone_id):
 @app.route("/add", methods=["GET", "POST"])
 def add_phone():
     if request.method == "POST":
-        session = ph.Session()
-        
         try:
-            phone = ph.Phone(
-                brand=request.form["brand"].upper(),
-                model=request.form["model"].upper(),
-                os=request.form["os"].upper(),
-                os_version=request.form["os_version"],
-                serial_number=request.form["serial_number"].upper(),
-                imei=request.form["imei"].upper(),
-                status=request.form["status"].upper(),
-                workstation=request.form["workstation"].upper()
-            )
-
-            ph.capPhoneDetails(phone)
-            session.add(phone)
-            session.commit()
+            # its own transaction, or the next group commit with PHONE_GROUP_COMMIT=on (capitalized inside)
+            ph.writePhone(ph.addPhoneRecord, phone_form_details())
 
             flash("Phone added successfully")
             return redirect(url_for("index"))
 
         except Exception as e:
-            session.rollback()
             flash(f"Error adding phone: {e}")
 
-        finally:
-            session.close()
-
     return render_template("add_phone.html")
 
 
@@ -114,37 +166,23 @@ def add_phone():
 
 @app.route("/update/<int:phone_id>", methods=["GET", "POST"])
 def update_phone(phone_id):
-    session = ph.Session()
-    phone = session.query(ph.Phone).filter_by(id=phone_id).first()
+    phone = ph.getPhoneRecord("id", phone_id)
 
     if not phone:
-        session.close()
         flash(f"Phone ID {phone_id} not found")
         return redirect(url_for("index"))
 
     if request.method == "POST":
         try:
-            phone.brand = request.form["brand"].upper()
-            phone.model = request.form["model"].upper()
-            phone.os = request.form["os"].upper()
-            phone.os_version = request.form["os_version"]
-            phone.serial_number = request.form["serial_number"].upper()
-            phone.imei = request.form["imei"].upper()
-            phone.status = request.form["status"].upper()
-            phone.workstation = request.form["workstation"].upper()
-
-            session.commit()
-            flash("Phone updated successfully")
-            return redirect(url_for("view_phone", phone_id=phone.id))
+            if ph.writePhone(ph.updatePhoneRecord, phone_id, phone_form_details()):
+                flash("Phone updated successfully")
+            else:
+                flash(f"Phone ID {phone_id} not found")
+            return redirect(url_for("view_phone", phone_id=phone_id))
 
         except Exception as e:
-            session.rollback()
             flash(f"Error updating phone: {e}")
 
-        finally:
-            session.close()
-
-    session.close()
     return render_template("update_phone.html", phone=phone)
 
 
@@ -153,26 +191,15 @@ def update_phone(phone_id):
 
 @app.route("/delete/<int:phone_id>", methods=["POST"])
 def delete_phone(phone_id):
-    session = ph.Session()
-    phone = session.query(ph.Phone).filter_by(id=phone_id).first()
-
-    if not phone:
-        session.close()
-        flash(f"Phone ID {phone_id} not found")
-        return redirect(url_for("index"))
-
     try:
-        session.delete(phone)
-        session.commit()
-        flash("Phone deleted successfully")
+        if ph.writePhone(ph.deletePhoneRecord, phone_id):
+            flash("Phone deleted successfully")
+        else:
+            flash(f"Phone ID {phone_id} not found")
 
     except Exception as e:
-        session.rollback()
         flash(f"Error deleting phone: {e}")
 
-    finally:
-        session.close()
-
     return redirect(url_for("index"))
 
 
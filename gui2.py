@@ -28,6 +28,10 @@ from phone import addPhone, updatePhone, deletePhone, viewPhone, viewPhones
 import phone
 
 
+# phones loaded into the table per page ("Load More" loads the next page)
+GUI_PAGE_SIZE = 500
+
+
 # ################################################
 # sub GUIs
 # ################################################
@@ -115,7 +119,7 @@ class AddPhoneDialog(QDialog):
         from phone import (
             Phone, validateBrand, validateModel, validateOSName,
             validateOSVersion, validateSerialNumber, validateIMEI,
-            validateStatus, validateWorkstation, session
+            validateStatus, validateWorkstation, validateOSCompatibility, transaction
         )
         
         # get values from the widgets
@@ -146,6 +150,11 @@ class AddPhoneDialog(QDialog):
             QMessageBox.warning(self, "Error", "Invalid OS!")
             return
         
+        # an Android can't be an iOS phone and vice versa
+        if not validateOSCompatibility(brand, model, os_name):
+            QMessageBox.warning(self, "Error", f"{brand} {model} doesn't run {os_name}!")
+            return
+        
         # validate OS Version
         os_version = validateOSVersion(os_version_text)
         if not os_version:
@@ -199,14 +208,13 @@ class AddPhoneDialog(QDialog):
                 workstation=workstation
             )
             
-            session.add(phone)
-            session.commit()
+            with transaction() as session:
+                session.add(phone)
             
             QMessageBox.information(self, "Success", f"Phone {brand} {model} added successfully!")
             self.accept()  # close dialog with success
             
         except Exception as e:
-            session.rollback()
             QMessageBox.critical(self, "Error", f"Failed to add phone: {e}")
 
 
@@ -216,7 +224,7 @@ class AddPhoneDialog(QDialog):
 class UpdatePhoneDialog(QDialog):
     def __init__(self, phone_obj, parent=None):
         super().__init__(parent)
-        self.phone = phone_obj  # SQLAlchemy Phone instance
+        self.phone = phone_obj  # SQLAlchemy Phone instance, detached (loaded by MainWindow.show_update_phone)
 
         self.setWindowTitle(f"Update Phone ID {self.phone.id}")
         self.setGeometry(400, 400, 400, 300)
@@ -279,9 +287,9 @@ class UpdatePhoneDialog(QDialog):
 
     def save_updates(self):
         from phone import (
-            validateBrand, validateModel, validateOSName, validateOSVersion,
+            Phone, validateBrand, validateModel, validateOSName, validateOSVersion,
             validateSerialNumber, validateIMEI, validateStatus,
-            validateWorkstation, session
+            validateWorkstation, validateOSCompatibility, transaction
         )
 
         # Brand
@@ -302,6 +310,11 @@ class UpdatePhoneDialog(QDialog):
             QMessageBox.warning(self, "Error", "Invalid OS")
             return
 
+        # an Android can't be an iOS phone and vice versa
+        if not validateOSCompatibility(brand, model, os_name):
+            QMessageBox.warning(self, "Error", f"{brand} {model} doesn't run {os_name}")
+            return
+
         # OS Version
         os_version = validateOSVersion(self.os_version_combo.currentText())
         if not os_version:
@@ -346,22 +359,22 @@ class UpdatePhoneDialog(QDialog):
         else:
             workstation = "UNASSIGNED"
 
-        # Apply updates
-        self.phone.brand = brand
-        self.phone.model = model
-        self.phone.os = os_name
-        self.phone.os_version = str(os_version)
-        self.phone.serial_number = serial
-        self.phone.imei = imei
-        self.phone.status = status
-        self.phone.workstation = workstation
-
+        # Apply updates in one unit of work
         try:
-            session.commit()
+            with transaction() as session:
+                phone_obj = session.get(Phone, self.phone.id)
+                phone_obj.brand = brand
+                phone_obj.model = model
+                phone_obj.os = os_name
+                phone_obj.os_version = str(os_version)
+                phone_obj.serial_number = serial
+                phone_obj.imei = imei
+                phone_obj.status = status
+                phone_obj.workstation = workstation
+
             QMessageBox.information(self, "Success", "Phone updated successfully")
             self.accept()
         except Exception as e:
-            session.rollback()
             QMessageBox.critical(self, "Error", f"Failed to update phone: {e}")
 
 
@@ -388,10 +401,11 @@ class MainWindow(QWidget):
         btn_delete = QPushButton("Delete a Phone")
         #btn_view = QPushButton("View a Phone")
         btn_view_all = QPushButton("View All Phones")
+        btn_stats = QPushButton("Fleet Stats")
         btn_exit = QPushButton("Exit")
     
         #buttons = [btn_add, btn_update, btn_delete, btn_view, btn_view_all, btn_exit]
-        buttons = [btn_add, btn_update, btn_delete, btn_view_all, btn_exit]
+        buttons = [btn_add, btn_update, btn_delete, btn_view_all, btn_stats, btn_exit]
         
         for b in buttons:
             b.setMinimumWidth(120)
@@ -402,6 +416,7 @@ class MainWindow(QWidget):
         btn_delete.clicked.connect(self.show_delete_phone)
         #btn_view.clicked.connect(self.show_view_phone)
         btn_view_all.clicked.connect(self.show_view_all_phones)
+        btn_stats.clicked.connect(self.show_fleet_stats)
         btn_exit.clicked.connect(self.close)
     
         # add buttons to the bar
@@ -450,7 +465,8 @@ class MainWindow(QWidget):
         row = selected[0].row()
         phone_id = int(self.table.item(row, 0).text())
     
-        phone_obj = phone.session.query(phone.Phone).filter_by(id=phone_id).first()
+        with phone.transaction() as session:
+            phone_obj = session.query(phone.Phone).filter_by(id=phone_id).first()
     
         dialog = UpdatePhoneDialog(phone_obj, self)
         if dialog.exec():
@@ -508,14 +524,8 @@ class MainWindow(QWidget):
     def show_view_all_phones(self):
         #QMessageBox.information(self, "View All", "View All Phones clicked!")
                 
-        # set global variable CLI to False because we are not running in CLI mode
-        phone.CLI = False
-        
-        # 1. get data from the database 
-        phones = phone.viewPhones() # from phone.py        
-        
-        # reset CLI to True
-        phone.CLI = True
+        # 1. get the first page of phones from the database (keyset paging, see phone.getPhonesPage)
+        phones, self.next_cursor = phone.getPhonesPage(limit=GUI_PAGE_SIZE)
         
         # 2. remove any existing widgets in the content area
         while self.content_layout.count():
@@ -529,30 +539,93 @@ class MainWindow(QWidget):
     
         # 3. create the Table
         self.table = QTableWidget()
-        self.table.setRowCount(len(phones))
         self.table.setColumnCount(8)
         self.table.setHorizontalHeaderLabels(["ID", "Brand", "Model", "OS", "Version", "Serial", "IMEI", "Status"])
     
         # 4. populate the Table
-        for row, ph in enumerate(phones): 
-            self.table.setItem(row, 0, QTableWidgetItem(str(ph.id)))
-            self.table.setItem(row, 1, QTableWidgetItem(str(ph.brand)))
-            self.table.setItem(row, 2, QTableWidgetItem(str(ph.model)))
-            self.table.setItem(row, 3, QTableWidgetItem(str(ph.os)))
-            self.table.setItem(row, 4, QTableWidgetItem(str(ph.os_version)))
-            self.table.setItem(row, 5, QTableWidgetItem(str(ph.serial_number)))
-            self.table.setItem(row, 6, QTableWidgetItem(str(ph.imei)))
-            self.table.setItem(row, 7, QTableWidgetItem(str(ph.status)))
+        self.add_table_rows(phones)
     
         # make the table look nice
         self.table.resizeColumnsToContents()
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers) # make it read-only
     
         self.content_layout.addWidget(self.table)
+        
+        # 5. the next page is only loaded on request
+        self.btn_load_more = QPushButton("Load More")
+        self.btn_load_more.clicked.connect(self.load_more_phones)
+        self.btn_load_more.setEnabled(self.next_cursor is not None)
+        self.content_layout.addWidget(self.btn_load_more)
     
         # adjust main window size to fit the table
         self.resize(800, 600)
     
+    
+    # append the next page of phones to the table
+    def load_more_phones(self):
+        if self.next_cursor is None:
+            return
+        
+        phones, self.next_cursor = phone.getPhonesPage(afterID=self.next_cursor, limit=GUI_PAGE_SIZE)
+        self.add_table_rows(phones)
+        self.btn_load_more.setEnabled(self.next_cursor is not None)
+    
+    
+    # add one row per phone at the bottom of the table
+    def add_table_rows(self, phones):
+        first = self.table.rowCount()
+        self.table.setRowCount(first + len(phones))
+        
+        for row, ph in enumerate(phones, start=first): 
+            self.table.setItem(row, 0, QTableWidgetItem(str(ph.id)))
+            self.table.setItem(row, 1, QTableWidgetItem(str(ph.brand)))
+            self.table.setItem(row, 2, QTableWidgetItem(str(ph.model)))
+            self.table.setItem(row, 3, QTableWidgetItem(str(ph.os)))
+            self.table.setItem(row, 4, QTableWidgetItem(str(ph.os_version)))
+            self.table.setItem(row, 5, QTableWidgetItem(str(ph.serial_number)))
+            self.table.setItem(row, 6, QTableWidgetItem(str(ph.imei)))
+            self.table.setItem(row, 7, QTableWidgetItem(str(ph.status)))
+    
+    
+    # show the fleet summary (phone.fleetStats reads the trigger-maintained summary tables, not every phone)
+    def show_fleet_stats(self):
+        stats = phone.fleetStats()
+        
+        # remove any existing widgets in the content area
+        while self.content_layout.count():
+            child = self.content_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+        
+        # totals by status
+        by_status = stats["by_status"]
+        totals = "   ".join(f"{status}: {count}" for status, count in by_status.items())
+        summary = QLabel(f"Total: {stats['total']}   {totals}")
+        summary.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
+        self.content_layout.addWidget(summary)
+        
+        # one row per status / brand / OS / version group
+        self.stats_table = QTableWidget()
+        self.stats_table.setColumnCount(5)
+        self.stats_table.setHorizontalHeaderLabels(["Status", "Brand", "OS", "Version", "Phones"])
+        self.stats_table.setRowCount(len(stats["groups"]))
+        
+        for row, group in enumerate(stats["groups"]):
+            self.stats_table.setItem(row, 0, QTableWidgetItem(group["status"]))
+            self.stats_table.setItem(row, 1, QTableWidgetItem(group["brand"]))
+            self.stats_table.setItem(row, 2, QTableWidgetItem(group["os"]))
+            self.stats_table.setItem(row, 3, QTableWidgetItem(group["os_version"]))
+            self.stats_table.setItem(row, 4, QTableWidgetItem(str(group["count"])))
+        
+        self.stats_table.resizeColumnsToContents()
+        self.stats_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers) # make it read-only
+        self.content_layout.addWidget(self.stats_table)
+        
+        # refresh on request
+        btn_refresh = QPushButton("Refresh")
+        btn_refresh.clicked.connect(self.show_fleet_stats)
+        self.content_layout.addWidget(btn_refresh)
+
         
 # main
 if __name__ == "__main__":
@@ -569,6 +642,9 @@ if __name__ == "__main__":
     """)
     
     
+    # bring an older phones.db up to date (archive, stats, change log, search index, ...) before any view reads it
+    phone.migrateDB()
+
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,333 @@
+#
+#  METRICS:  Prometheus text format on /metrics for flaskphone.py and fastapi/fastapiphone.py
+#
+#  Counters and histograms are kept per thread (no lock on the request path) and summed when /metrics is
+#  scraped.  Gauges are read when /metrics is scraped:  DB pool, lookup cache, group commit and fleet size.
+#
+
+
+import sys, time, bisect, threading
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import phone as ph
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds:  a cached lookup is well under 1 ms, an export of the whole fleet takes seconds
+HTTP_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+REGISTRY = []
+
+
+# label values as Prometheus wants them:  backslash, quote and newline escaped
+def labelText(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# a counter or a histogram:  every thread writes to its own dict, a scrape adds them up
+class ShardedMetric:
+    kind = None
+
+    def __init__(self, name, helpText, labels=()):
+        self.name = name
+        self.helpText = helpText
+        self.labels = tuple(labels)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []    # (thread, values) of every thread that recorded something
+        self.retired = {}   # the values of the threads that are gone (the Flask dev server starts one per request)
+        REGISTRY.append(self)
+
+    # this thread's values; the lock is only taken the first time a thread records
+    def shard(self):
+        try:
+            return self.local.values
+        except AttributeError:
+            values = self.local.values = {}
+            with self.lock:
+                self.shards.append((threading.current_thread(), values))
+            return values
+
+    # the values of all threads:  {label values: value}
+    def collect(self):
+        with self.lock:
+            alive = []
+            for thread, values in self.shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self.merge(self.retired, values)
+            self.shards = alive
+
+            total = {}
+            self.merge(total, self.retired)
+            for _, values in alive:
+                self.merge(total, values)   # the copy in merge is atomic:  the owner may keep writing
+
+        return total
+
+
+class Counter(ShardedMetric):
+    kind = "counter"
+
+    def inc(self, *labelValues, amount=1):
+        values = self.shard()
+        values[labelValues] = values.get(labelValues, 0) + amount
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in list(values.items()):
+            total[key] = total.get(key, 0) + value
+
+    def render(self):
+        return [f"{self.name}{labelText(self.labels, key)} {value}" for key, value in sorted(self.collect().items())]
+
+
+class Histogram(ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name, helpText, labels=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, helpText, labels)
+        self.buckets = tuple(buckets)
+
+    # counts per bucket (the last one is +Inf) and the sum
+    def observe(self, value, *labelValues):
+        values = self.shard()
+        entry = values.get(labelValues)
+        if entry is None:
+            entry = values[labelValues] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @staticmethod
+    def merge(total, values):
+        for key, (counts, sum_) in list(values.items()):
+            entry = total.setdefault(key, [[0] * len(counts), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += sum_
+
+    def render(self):
+        lines = []
+        names = self.labels + ("le",)
+        for key, (counts, sum_) in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{labelText(names, key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{labelText(self.labels, key)} {sum_}")
+            lines.append(f"{self.name}_count{labelText(self.labels, key)} {cumulative}")
+        return lines
+
+
+# a value read when /metrics is scraped:  fn() returns {label values: value}
+class Gauge:
+    def __init__(self, name, helpText, labels=(), fn=None, kind="gauge"):
+        self.name = name
+        self.helpText = helpText
+        self.labels = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+        REGISTRY.append(self)
+
+    def render(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return []   # e.g. the database is not there yet:  leave it out of this scrape
+        return [f"{self.name}{labelText(self.labels, key)} {value}" for key, value in sorted(values.items())]
+
+
+# everything in the Prometheus text format
+def render():
+    """
+    Render every metric for a Prometheus scrape.
+    Return:  the text for GET /metrics (CONTENT_TYPE)
+    """
+
+    lines = []
+    for metric in REGISTRY:
+        samples = metric.render()
+        if samples:
+            lines.append(f"# HELP {metric.name} {metric.helpText}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+# HTTP:
+# -----
+
+httpRequests = Counter("phone_http_requests_total", "HTTP requests by route and status code.",
+                       ("app", "method", "route", "status"))
+httpLatency = Histogram("phone_http_request_duration_seconds", "HTTP request latency by route.",
+                        ("app", "method", "route"), HTTP_BUCKETS)
+httpExceptions = Counter("phone_http_exceptions_total", "Requests that ended in an unhandled exception.",
+                         ("app", "route"))
+
+
+# one finished request; route is the route's pattern (/phones/id/{id}), never the raw path
+def recordRequest(app, method, route, status, seconds):
+    httpRequests.inc(app, method, route, status)
+    httpLatency.observe(seconds, app, method, route)
+
+
+# ASGI middleware for FastAPI:  app.add_middleware(metrics.ASGIMetrics)
+class ASGIMetrics:
+    def __init__(self, app, appName="fastapi"):
+        self.app = app
+        self.appName = appName
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def sendStatus(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendStatus)
+        except Exception:
+            httpExceptions.inc(self.appName, routeOf(scope))
+            raise
+        finally:
+            recordRequest(self.appName, scope["method"], routeOf(scope), status[0], time.perf_counter() - start)
+
+
+# the router puts the matched route in the scope
+def routeOf(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# the same for a Flask app:  instrumentFlask(app)
+def instrumentFlask(app, appName="flask"):
+    from flask import request, g
+
+    @app.before_request
+    def startTimer():
+        g.metricsStart = time.perf_counter()
+
+    @app.after_request
+    def recordResponse(response):
+        start = g.pop("metricsStart", None)
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            recordRequest(appName, request.method, rule, response.status_code, time.perf_counter() - start)
+        return response
+
+    # Flask turns an unhandled exception into a 500 (after_request has recorded it) or, when it propagates, skips after_request
+    @app.teardown_request
+    def recordException(error):
+        if error is None:
+            return
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        httpExceptions.inc(appName, rule)
+
+        start = g.pop("metricsStart", None)
+        if start is not None:
+            recordRequest(appName, request.method, rule, 500, time.perf_counter() - start)
+
+    return app
+
+
+# Database:
+# ---------
+
+dbLatency = Histogram("phone_db_statement_duration_seconds", "SQL statement execution time by statement type.",
+                      ("statement",), DB_BUCKETS)
+dbErrors = Counter("phone_db_errors_total", "SQL statements that raised an error.", ("statement",))
+
+
+# every engine (sync, and the sync engine inside the async one) is timed:  listen on the Engine class
+@event.listens_for(Engine, "before_cursor_execute")
+def startStatement(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metricsStart"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def finishStatement(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("metricsStart", None)
+    if start is not None:
+        dbLatency.observe(time.perf_counter() - start, statementType(statement))
+
+
+@event.listens_for(Engine, "handle_error")
+def statementError(exceptionContext):
+    dbErrors.inc(statementType(exceptionContext.statement or ""))
+
+
+# SELECT, INSERT, UPDATE, DELETE, ... (a handful of label values)
+def statementType(statement):
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "OTHER"
+
+
+# checked out / idle connections of the engines that exist (phone.py's and, in FastAPI, asyncphone.py's)
+def poolConnections():
+    aph = sys.modules.get("asyncphone")
+    asyncEngine = aph.asyncEngine if aph else None
+
+    values = {}
+    for name, engine in (("sync", ph.dbEngine), ("async", asyncEngine and asyncEngine.sync_engine)):
+        pool = getattr(engine, "pool", None)
+        if pool is None or not hasattr(pool, "checkedout"):
+            continue
+        values[(name, "checked_out")] = pool.checkedout()
+        values[(name, "idle")] = pool.checkedin()
+        values[(name, "size")] = pool.size()
+    return values
+
+
+Gauge("phone_db_pool_connections", "Connections of the DB pools by state.", ("engine", "state"), poolConnections)
+
+
+# Lookup cache, group commit, snapshot, fleet:
+# --------------------------------------------
+
+Gauge("phone_lookup_cache_requests_total", "Lookup cache hits and misses.", ("result",),
+      lambda: {("hit",): ph.cacheStats()["hits"], ("miss",): ph.cacheStats()["misses"]}, kind="counter")
+Gauge("phone_lookup_cache_evictions_total", "Lookup cache entries evicted (LRU) or expired (TTL).", ("reason",),
+      lambda: {("lru",): ph.cacheStats()["evictions"], ("ttl",): ph.cacheStats()["expirations"]}, kind="counter")
+Gauge("phone_lookup_cache_entries", "Phones in the lookup cache.", (), lambda: {(): ph.cacheStats()["size"]})
+
+
+# hits / (hits + misses), 0 before the first lookup
+def cacheHitRatio():
+    stats = ph.cacheStats()
+    lookups = stats["hits"] + stats["misses"]
+    return {(): round(stats["hits"] / lookups, 4) if lookups else 0}
+
+
+Gauge("phone_lookup_cache_hit_ratio", "Share of lookups answered by the lookup cache.", (), cacheHitRatio)
+
+Gauge("phone_group_commit_writes_total", "Writes committed by the group committer.", (),
+      lambda: {(): ph.groupCommitter.committed}, kind="counter")
+Gauge("phone_group_commit_batches_total", "Batches (transactions) committed by the group committer.", (),
+      lambda: {(): ph.groupCommitter.batches}, kind="counter")
+Gauge("phone_group_commit_queued", "Writes waiting for the next group commit.", (),
+      lambda: {(): ph.groupCommitter.writes.qsize()})
+
+Gauge("phone_snapshot_builds_total", "Builds of the pre-encoded /phones/all snapshot.", (),
+      lambda: {(): ph.phoneSnapshot.builds}, kind="counter")
+Gauge("phone_snapshot_bytes", "Size of the /phones/all snapshot by encoding.", ("encoding",),
+      lambda: {(encoding,): size for encoding, size in ph.phoneSnapshot.stats().get("bytes", {}).items()})
+
+# from the summary tables (see phone.fleetStats):  a few rows, not a COUNT(*) over phone
+Gauge("phone_fleet_phones", "Phones by status.", ("status",),
+      lambda: {(status,): count for status, count in ph.fleetStats()["by_status"].items()})
@@ -1,7 +1,7 @@
 #
 # Look for "NEXT:" to continue next time:
 #
-# NEXT:  1/3/26 valid that if it is an Android, it won't pick iOS and vice versa.
+# DONE:  1/3/26 valid that if it is an Android, it won't pick iOS and vice versa.  (see PHONE_RULES)
 #
 
 #
@@ -9,10 +9,17 @@
 #
 
 
-import os, time, sys
+import os, re, time, sys, io, csv, json, base64, math, gzip, queue, shutil, hashlib, sqlite3, threading
 
-from sqlalchemy import create_engine, Column, Integer, String, Enum, text
-from sqlalchemy.orm import declarative_base, sessionmaker
+from collections import OrderedDict, namedtuple, deque
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event, select, Column, Integer, String, Enum, Index, text, and_, tuple_, union_all
+from sqlalchemy.orm import declarative_base, sessionmaker, Session as SQLASession
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from sqlalchemy.exc import IntegrityError
 
 from sqlalchemy.inspection import inspect
 
@@ -24,12 +31,105 @@ from sqlalchemy.inspection import inspect
 CLI = True  
 
 
-# Setup
+# SQLite settings:  path and tuning come from the environment (the Dockerfile sets SQLITE_DB_PATH)
+
+DB_PATH = os.environ.get("SQLITE_DB_PATH", "phones.db")  # "phones" is the database name
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),       # readers don't block the writer
+    "synchronous":  os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),     # safe with WAL, far fewer fsyncs
+    "cache_size":   int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),  # negative means KiB:  64 MB
+    "mmap_size":    int(os.environ.get("SQLITE_MMAP_SIZE", "268435456")),  # 256 MB
+    "temp_store":   os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000")),  # ms to wait on a locked DB
+}
+
+
+# create the engine shared by the CLI, GUI, Flask and FastAPI; the pragmas are applied to every new connection
+def createDBEngine(path=None, pragmas=None):
+    path = path or DB_PATH
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    newEngine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(newEngine, "connect")
+    def setPragmas(dbapi_connection, connection_record):
+        applyPragmas(dbapi_connection, pragmas)
+
+    if QUERY_STATS:
+        instrumentEngine(newEngine)
 
-engine = create_engine('sqlite:///phones.db')  # "phones" is the database name
+    return newEngine
+
+
+# run the PRAGMA statements on a new DBAPI connection (sqlite3 or aiosqlite's adapter)
+def applyPragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+# sessions of this class announce their phone changes (see Change notifications), sync or async;
+# without a bind they use the shared engine (created on first use, see getEngine)
+class PhoneSession(SQLASession):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=getEngine() if bind is None else bind, **kwargs)
+
+
+# Setup:  importing phone.py does no I/O, the engine is only created when it is first needed
+
+dbEngine = None
+dbEngineLock = threading.Lock()
 Base = declarative_base()
-Session = sessionmaker(bind=engine)
-session = Session()
+Session = sessionmaker(class_=PhoneSession)
+
+
+# the shared engine, created on first use
+def getEngine():
+    global dbEngine
+    if dbEngine is None:
+        with dbEngineLock:
+            if dbEngine is None:
+                dbEngine = createDBEngine()
+    return dbEngine
+
+
+# phone.engine still works for the front ends and scripts:  it is getEngine() on first access
+def __getattr__(name):
+    if name == "engine":
+        return getEngine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# unit of work:  with transaction() as session:  ...  commits on success, rolls back on an error, always closes
+@contextmanager
+def transaction(session=None):
+    # the caller already has a session:  join it, the caller commits
+    if session is not None:
+        yield session
+        session.flush()  # surface constraint errors (duplicate IMEI, ...) here
+        return
+
+    # objects stay readable after the commit, e.g. to print or return them
+    session = Session(expire_on_commit=False)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# point phone.py at another engine (a test or benchmark database):  sessions, caches and indexes follow
+def useEngine(newEngine):
+    global dbEngine
+    dbEngine = newEngine
+
+    uniqueIndex.versionConn = None
+    notifyPhoneChanges(None)
 
 
 # enumerated type for status
@@ -45,7 +145,14 @@ statusEnum = Enum("ACTIVE", "UNASSIGNED", "RETIRED", name="statusEnum")
 class Phone(Base):
     # class variable __tablename__ sets the table name in the database:  "phone"
     __tablename__ = "phone"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (
+        # secondary indexes for the workstation lookup, the status filter and the brand/OS reports
+        Index("ix_phone_workstation", "workstation"),
+        Index("ix_phone_status", "status"),
+        Index("ix_phone_brand_os_version", "brand", "os", "os_version"),
+        Index("ix_phone_os_version", "os", "os_version"),     # the OS filters of GET /phones without a brand
+        {"sqlite_autoincrement": True}
+    )
     
     id =            Column(Integer, primary_key=True, autoincrement=True)  # auto increment   
     brand =         Column(String, nullable=False)          # "Samsung", "Apple"
@@ -61,14 +168,107 @@ class Phone(Base):
         return (f"Phone(id={self.id}, brand={self.brand}, model={self.model}, os={self.os}, os_version={self.os_version}, serial_number={self.serial_number}, imei={self.imei}, status={self.status}), workstation={self.workstation})")
 
 
+# every column of the "phone" table, in table order:  id, brand, model, ...
+PHONE_COLUMNS = [column.key for column in Phone.__table__.columns]
+
+# read-only phone for listings (getPhonesPage, iterPhones, viewPhones):  phone.id, phone.brand, ... like a Phone,
+# but a plain immutable tuple without ORM state or identity map entry; phone._asdict() for JSON
+PhoneRow = namedtuple("PhoneRow", PHONE_COLUMNS)
+
+
+# fleet summary tables, kept up to date by triggers on "phone" (see createStatsTriggers)
+
+# number of phones per status, brand, OS and OS version
+class PhoneStats(Base):
+    __tablename__ = "phone_stats"
+
+    status =        Column(String, primary_key=True)
+    brand =         Column(String, primary_key=True)
+    os =            Column(String, primary_key=True)
+    os_version =    Column(String, primary_key=True)
+    count =         Column(Integer, nullable=False, default=0)
+
+
+# number of phones per workstation and status
+class WorkstationStats(Base):
+    __tablename__ = "workstation_stats"
+
+    workstation =   Column(String, primary_key=True)
+    status =        Column(String, primary_key=True)
+    count =         Column(Integer, nullable=False, default=0)
+
+
+# cold storage for phones RETIRED long ago (see archiveRetiredPhones):  same details and IDs as in "phone"
+class PhoneArchive(Base):
+    __tablename__ = "phone_archive"
+
+    id =            Column(Integer, primary_key=True, autoincrement=False)  # the ID it had in "phone"
+    brand =         Column(String, nullable=False)
+    model =         Column(String, nullable=False)
+    os =            Column(String, nullable=False)
+    os_version =    Column(String, nullable=False)
+    serial_number = Column(String, nullable=False, unique=True)
+    imei =          Column(String, nullable=False, unique=True)
+    status =        Column(statusEnum, default="RETIRED")
+    workstation =   Column(String, default="UNASSIGNED")
+    retired_at =    Column(String)                  # ISO 8601 UTC, from "phone_retired"
+    archived_at =   Column(String, nullable=False)  # ISO 8601 UTC
+
+    def __repr__(self):
+        return (f"PhoneArchive(id={self.id}, brand={self.brand}, model={self.model}, serial_number={self.serial_number}, imei={self.imei}, retired_at={self.retired_at})")
+
+
+# when each RETIRED phone in "phone" was retired, kept up to date by triggers (see createArchiveTriggers)
+class PhoneRetired(Base):
+    __tablename__ = "phone_retired"
+
+    phone_id =      Column(Integer, primary_key=True)
+    retired_at =    Column(String, nullable=False)  # ISO 8601 UTC
+
+
+# each phone's version and when it last changed, kept up to date by triggers (see createVersionTriggers)
+class PhoneVersion(Base):
+    __tablename__ = "phone_version"
+
+    phone_id =      Column(Integer, primary_key=True)
+    version =       Column(Integer, nullable=False)
+    updated_at =    Column(String, nullable=False)  # ISO 8601 UTC
+
+
+# create missing tables and indexes without touching existing data (safe to run on every startup)
+def migrateDB(targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+
+    # create_all skips tables that already exist, along with their indexes
+    Base.metadata.create_all(targetEngine)
+
+    # so add any index that an older phones.db is missing
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(targetEngine, checkfirst=True)
+
+    createSearchIndex(targetEngine)
+    createStatsTriggers(targetEngine)
+    createChangeLog(targetEngine)
+    createArchiveTriggers(targetEngine)
+    createVersionTriggers(targetEngine)
+
+
 # initalize the database so phone ID will start at 1000
 def initDB():
     
     # only use drop for testing, not the final app
-    Base.metadata.drop_all(engine)
-    Base.metadata.create_all(engine)
+    with getEngine().begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS phone_fts"))  # not in Base.metadata, see createSearchIndex
+    Base.metadata.drop_all(getEngine())
+    migrateDB()
+    notifyPhoneChanges(None)
     
-    with engine.connect() as conn:
+    # the change log survives:  tell its readers to start over
+    with getEngine().begin() as conn:
+        conn.execute(text("INSERT INTO phone_changes (op) VALUES ('reset')"))
+    
+    with getEngine().connect() as conn:
         
         # check to see if phone database already has data so won't insert dummy phone
         result = conn.execute(text("SELECT COUNT(*) FROM phone"))
@@ -83,6 +283,7 @@ def initDB():
                 VALUES (999, 'dummy', 'dummy', 'dummy', '0', 'x', 'y')
             """))
             conn.execute(text("DELETE FROM phone WHERE id = 999"))
+            conn.execute(text("DELETE FROM phone_changes WHERE phone_id = 999"))
     
             # set next phone ID to 1000
             conn.execute(text("UPDATE sqlite_sequence SET seq = 999 WHERE name = 'phone'"))
@@ -138,118 +339,722 @@ def CLIMenu():
             print("Please try again.")                   
 
 
-# Validation functions:
+# Uniqueness index:
+# -----------------
+
+# "local":  one process owns the database (CLI, GUI, one server worker)
+# "shared":  several worker processes write to the same database, reload the index when another process commits
+# "off":  always ask the database
+UNIQUE_INDEX_MODE = os.environ.get("PHONE_UNIQUE_INDEX", "local")
+
+
+# fixed size Bloom filter:  "not in" is always right, "in" is wrong about errorRate of the time
+class BloomFilter:
+    def __init__(self, capacity=100000, errorRate=0.01):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(errorRate) / math.log(2) ** 2), 64)  # bits
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    # bit positions for a value:  double hashing over one 128 bit digest
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+# in-memory serial number and IMEI index:  a Bloom filter in front of an exact set per column
+class UniqueIndex:
+    FIELDS = ["serial_number", "imei"]
+
+    def __init__(self, targetEngine=None, mode=None):
+        self.targetEngine = targetEngine
+        self.mode = mode or UNIQUE_INDEX_MODE
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.values = {}
+        self.blooms = {}
+        self.dataVersion = None
+        self.versionConn = None
+        self.lastSeq = None     # "shared" mode:  the newest phone_changes row the index has seen
+        self.ownChanges = []    # "shared" mode:  (phone ID, op) of this process's commits since then
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    # read every serial number and IMEI once (lock held)
+    def load(self):
+        # before the read:  a commit after it moves data_version and is found in the change log
+        self.dataVersion = self.readDataVersion()
+
+        targetEngine = self.targetEngine or getEngine()
+        with targetEngine.connect() as conn:
+            # a phones.db that migrateDB hasn't brought up to date yet has no archive and no change log
+            tables = set(inspect(conn).get_table_names())
+
+            # archived phones keep their serial numbers and IMEIs
+            stmt = select(Phone.serial_number, Phone.imei)
+            if PhoneArchive.__tablename__ in tables:
+                stmt = stmt.union_all(select(PhoneArchive.serial_number, PhoneArchive.imei))
+            rows = conn.execute(stmt).all()
+
+            # the same read transaction:  the log position of exactly these values (no log:  reload on every change)
+            if self.mode == "shared":
+                if "phone_changes" in tables:
+                    self.lastSeq = conn.execute(text("SELECT COALESCE(MAX(seq), 0) FROM phone_changes")).scalar()
+                else:
+                    self.lastSeq = None
+                self.ownChanges = []
+
+        # room to grow before the filters fill up and have to be rebuilt
+        capacity = max(len(rows) * 2, 10000)
+        for i, field in enumerate(self.FIELDS):
+            self.values[field] = {row[i] for row in rows}
+            self.blooms[field] = BloomFilter(capacity)
+            for value in self.values[field]:
+                self.blooms[field].add(value)
+
+        self.loaded = True
+
+    # "shared" mode only:  PRAGMA data_version changes whenever another connection commits
+    def readDataVersion(self):
+        if self.mode != "shared":
+            return None
+
+        if self.versionConn is None:
+            targetEngine = self.targetEngine or getEngine()
+            self.versionConn = sqlite3.connect(targetEngine.url.database, check_same_thread=False)
+
+        return self.versionConn.execute("PRAGMA data_version").fetchone()[0]
+
+    # "shared" mode:  data_version moved, but only our own commits (already applied) are in the change log since lastSeq
+    def onlyOwnChanges(self):
+        if self.lastSeq is None:
+            return False
+
+        rows = self.versionConn.execute(
+            "SELECT seq, phone_id, op FROM phone_changes WHERE seq > ? ORDER BY seq", (self.lastSeq,)
+        ).fetchall()
+
+        own = self.ownChanges
+        self.ownChanges = []
+        if rows and rows[0][0] != self.lastSeq + 1:
+            return False  # the log was compacted past lastSeq
+
+        for seq, phoneID, op in rows:
+            if (phoneID, op) not in own:
+                return False  # another process's commit, or one of ours not applied yet
+            own.remove((phoneID, op))
+            self.lastSeq = seq
+
+        return True
+
+    # True if a phone already has this serial number / IMEI
+    def contains(self, field, value):
+        with self.lock:
+            # data_version can't tell our commits from other processes' (several commits may move it once):  the
+            # change log can
+            if self.loaded and self.mode == "shared":
+                version = self.readDataVersion()
+                if version != self.dataVersion:
+                    self.dataVersion = version
+                    self.loaded = self.onlyOwnChanges()
+
+            if not self.loaded:
+                self.load()
+
+            # most new values stop here without a set lookup or a query
+            if value not in self.blooms[field]:
+                return False
+
+            return value in self.values[field]
+
+    # keep the index in sync after a commit:  added and removed are lists of (field, value), own are the
+    # (phone ID, op) of the commit for the "shared" mode change log check
+    def apply(self, added=(), removed=(), own=()):
+        with self.lock:
+            if not self.loaded:
+                return  # nothing to update, the next check loads a fresh copy
+
+            if self.mode == "shared":
+                self.ownChanges.extend(own)
+
+            for field, value in removed:
+                self.values[field].discard(value)
+
+            for field, value in added:
+                self.values[field].add(value)
+                self.blooms[field].add(value)
+
+            # too many values (or deleted values still in the filters):  rebuild on the next check
+            if len(self.values[self.FIELDS[0]]) > self.blooms[self.FIELDS[0]].capacity:
+                self.loaded = False
+
+    # forget everything, the next check reloads from the database (bulk deletes, drop_all, ...)
+    def invalidate(self):
+        with self.lock:
+            self.loaded = False
+
+    # phoneListeners callback:  turn committed phone changes into added and removed values
+    def onPhoneChanges(self, changes):
+        if changes is None:
+            self.invalidate()
+            return
+
+        added, removed, own = [], [], []
+        for op, before, after in changes:
+            # the rows this commit wrote to phone_changes (an update that changed nothing writes none)
+            details = after or before
+            if op != "update" or any(before.get(column) != value for column, value in after.items()):
+                own.append((details.get("id"), op))
+
+            for field in self.FIELDS:
+                old = before.get(field) if before else None
+                new = after.get(field) if after else None
+                if old == new:
+                    continue
+
+                # a changed or deleted value that was never loaded:  can't tell what to remove
+                if before and field not in before:
+                    self.invalidate()
+                    return
+
+                if old is not None:
+                    removed.append((field, old))
+                if new is not None:
+                    added.append((field, new))
+
+        self.apply(added, removed, own)
+
+
+uniqueIndex = UniqueIndex()
+
+
+# Change notifications:
 # ---------------------
 
-# validate the first letter of the brand entered and return SAMSUNG, APPLE, OTHER or None
-def validateBrand(brand=None):  # brand should be S, A, O
-    BRANDS = {'S': 'Samsung', 'A': 'Apple', 'O': 'Other'}
+# callbacks told about every committed change to a phone:  listener(changes)
+# changes is a list of (op, before, after):  op is "insert", "update" or "delete", before/after are dicts of
+# phone details (None for the side that doesn't exist, details that were never loaded are left out);
+# changes is None when a bulk statement changed an unknown set of phones
+phoneListeners = []
 
-    if not brand:
-        print("ERROR:  Brand is required.")
-        return None
 
-    key = brand.upper()
-    if key not in BRANDS:
-        return None
-    
-    return BRANDS[key].upper()  # returns SAMSUNG, APPLE, OTHER
+def notifyPhoneChanges(changes):
+    for listener in phoneListeners:
+        listener(changes)
 
 
-# validate the model and return model or the model or None
-def validateModel(model=None):
-    if not model or not model.strip():
-        print("ERROR:  Model is required.")
-        return None
+# the details of a phone in the session:  {"id": 1000, "brand": "SAMSUNG", ...}, loaded details only
+def loadedDetails(state):
+    details = {column: state.dict[column] for column in PHONE_COLUMNS if column in state.dict}
+    if state.identity:
+        details["id"] = state.identity[0]
+    return details
 
-    model = model.strip().upper()
 
-    # validate against "OTHER" models
-    if model == 'OTHER':
-        print("INFO:  'Other' model selected.")
-        return model
-    
-    # validate Android models
-    # -----------------------
-    
-    samsungPres = ['S', 'A', 'FOLD', 'FLIP']
-    
-    # S and A models
-    if model.startswith(samsungPres[0]) or model.startswith(samsungPres[1]):
-        number = model[1:]  # S22 -> S, 22; A23 -> A, 23; 
-        
-        if number.isdigit():
-            return model
+# collect what each flush does to phones; the changes are announced only after the commit
+@event.listens_for(PhoneSession, "after_flush")
+def collectPhoneChanges(s, flushContext):
+    changes = s.info.setdefault("phoneChanges", [])
+
+    for obj in s.new:
+        if isinstance(obj, Phone):
+            changes.append(("insert", None, loadedDetails(inspect(obj))))
+
+    for obj in s.deleted:
+        if isinstance(obj, Phone):
+            changes.append(("delete", loadedDetails(inspect(obj)), None))
+
+    for obj in s.dirty:
+        if isinstance(obj, Phone) and s.is_modified(obj):
+            state = inspect(obj)
+            before, after = {"id": state.identity[0]}, {"id": state.identity[0]}
+
+            # attribute history still holds the pre-flush values here
+            for column in PHONE_COLUMNS:
+                history = state.attrs[column].history
+                if history.unchanged:
+                    before[column] = after[column] = history.unchanged[0]
+                    continue
+                if history.deleted:
+                    before[column] = history.deleted[0]
+                if history.added:
+                    after[column] = history.added[0]
+
+            changes.append(("update", before, after))
+
+
+@event.listens_for(PhoneSession, "after_commit")
+def announcePhoneChanges(s):
+    changes = s.info.pop("phoneChanges", None)
+    if changes:
+        notifyPhoneChanges(changes)
+
+
+@event.listens_for(PhoneSession, "after_rollback")
+def discardPhoneChanges(s):
+    s.info.pop("phoneChanges", None)
+
+
+# query(Phone).delete() / .update() don't flush objects, so the listeners can't be told what changed
+@event.listens_for(PhoneSession, "after_bulk_delete")
+@event.listens_for(PhoneSession, "after_bulk_update")
+def announceBulkChange(context):
+    notifyPhoneChanges(None)
+
+
+phoneListeners.append(uniqueIndex.onPhoneChanges)
+
+
+# Lookup cache:
+# -------------
+
+# single phone lookups (by ID, IMEI, serial number or workstation) are served from a bounded LRU cache;
+# commits in this process invalidate it exactly, the TTL bounds staleness from other processes
+PHONE_CACHE_SIZE = int(os.environ.get("PHONE_CACHE_SIZE", "4096"))
+PHONE_CACHE_TTL = float(os.environ.get("PHONE_CACHE_TTL", "30"))  # seconds
+
+LOOKUP_FIELDS = ["id", "imei", "serial_number", "workstation"]
+
+
+# LRU + TTL cache of phone records keyed by (lookup field, value)
+class PhoneCache:
+    def __init__(self, maxSize=PHONE_CACHE_SIZE, ttl=PHONE_CACHE_TTL):
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires at, record), oldest first
+        self.generation = 0  # bumped by every invalidation, see put
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    # the cached record (a copy) or None
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires, record = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(record)
+
+    # cache a record read from the database, unless a commit invalidated phones since the read started
+    def put(self, key, record, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            self.entries[key] = (time.monotonic() + self.ttl, record)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    # phoneListeners callback:  drop every key an added, updated or deleted phone had or now has
+    def onPhoneChanges(self, changes):
+        if changes is None:
+            self.clear()
+            return
+
+        keys = set()
+        for op, before, after in changes:
+            for details in [before, after]:
+                if not details:
+                    continue
+
+                # a lookup detail that was never loaded:  can't tell which key to drop
+                if op != "insert" and any(field not in details for field in LOOKUP_FIELDS):
+                    self.clear()
+                    return
+
+                keys.update((field, details[field]) for field in LOOKUP_FIELDS if field in details)
+
+        self.invalidate(keys)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.maxSize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+phoneCache = PhoneCache()
+phoneListeners.append(phoneCache.onPhoneChanges)
+
+
+# a detached, JSON serializable copy of a phone:  {"id": 1000, "brand": "SAMSUNG", ...}
+def phoneRecord(phone):
+    return {column: getattr(phone, column) for column in PHONE_COLUMNS}
+
+
+# look one phone up by id, imei, serial_number or workstation, read through the cache
+def getPhoneRecord(field, value, includeArchived=False):
+    """
+    Get a phone by one of the LOOKUP_FIELDS (values are matched exactly, capitalize them first).
+    With includeArchived, phones moved to "phone_archive" are found too (not cached).
+    Return:  the phone as a dict, None if not found
+    """
+
+    stmt = lookupStatement(field, value)
+
+    key = (field, value)
+    record = phoneCache.get(key)
+    if record is not None:
+        return record
+
+    generation = phoneCache.generation
+    with Session() as s:
+        phone = s.scalars(stmt).first()
+        if not phone:
+            if includeArchived:
+                phone = s.scalars(lookupStatement(field, value, PhoneArchive)).first()
+                return phoneRecord(phone) if phone else None
+            return None  # not cached:  a phone added later must be found right away
+        record = phoneRecord(phone)
+
+    phoneCache.put(key, record, generation)
+    return dict(record)
+
+
+# the SELECT for one phone by a LOOKUP_FIELDS column, shared with the async data path
+def lookupStatement(field, value, model=Phone):
+    if field not in LOOKUP_FIELDS:
+        raise ValueError(f"Can't look phones up by {field}.  Use one of {LOOKUP_FIELDS}.")
+
+    return select(model).where(getattr(model, field) == value).limit(1)
+
+
+# SQLite allows 32766 bound variables per statement (999 before 3.32):  IN lists stay well under both
+LOOKUP_CHUNK_SIZE = 500
+
+
+# look many phones up at once:  the cached ones from the cache, the rest with one IN (...) query per field and chunk
+def lookupMany(keys, includeArchived=False):
+    """
+    Get phones by lists of LOOKUP_FIELDS values:  {"imei": [...], "id": [...], ...} (values are matched exactly,
+    capitalize them first).  A workstation finds the phone with the lowest ID there, like getPhoneRecord.
+    With includeArchived, the ones not in "phone" are looked up in "phone_archive" too (not cached).
+    Return:  {field: {value: the phone as a dict, None if not found}} for every field and value asked for
+    """
+
+    results = cachedLookups(keys)
+
+    generation = phoneCache.generation
+    with getEngine().connect() as conn:
+        for field, stmt in lookupManyStatements(notFound(results)):
+            addLookups(results, field, conn.execute(stmt), generation)
+
+        if includeArchived:
+            for field, stmt in lookupManyStatements(notFound(results), PhoneArchive):
+                addLookups(results, field, conn.execute(stmt))
+
+    return results
+
+
+# {field: {value: cached record or None}} with every value asked for, duplicates once
+def cachedLookups(keys):
+    unknown = [field for field in keys if field not in LOOKUP_FIELDS]
+    if unknown:
+        raise ValueError(f"Can't look phones up by {unknown}.  Use some of {LOOKUP_FIELDS}.")
+
+    return {field: {value: phoneCache.get((field, value)) for value in values} for field, values in keys.items()}
+
+
+# {field: [values]} of the lookups without a phone yet
+def notFound(results):
+    return {field: [value for value, record in found.items() if record is None] for field, found in results.items()}
+
+
+# the SELECTs for the values not found yet, one per field and LOOKUP_CHUNK_SIZE values, shared with the async data path
+def lookupManyStatements(missing, model=Phone):
+    columns = [getattr(model, column) for column in PHONE_COLUMNS]
+    for field, values in missing.items():
+        for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            stmt = select(*columns).where(getattr(model, field).in_(values[start:start + LOOKUP_CHUNK_SIZE]))
+            # several phones at one workstation:  the first one, like lookupStatement's index order
+            yield field, (stmt.order_by(model.id) if field == "workstation" else stmt)
+
+
+# put the rows of a lookupManyStatements query into results (and into the cache, given the generation the read started at)
+def addLookups(results, field, rows, generation=None):
+    found = results[field]
+    for row in rows.tuples():
+        record = dict(zip(PHONE_COLUMNS, row))
+        value = record[field]
+        if found.get(value) is None:
+            found[value] = record
+            if generation is not None:
+                phoneCache.put((field, value), dict(record), generation)
+
+
+# hit/miss/eviction counters of the lookup cache
+def cacheStats():
+    return phoneCache.stats()
+
+
+# Batch validation:
+# -----------------
+
+# the rules every phone record is checked against, compiled once
+PHONE_RULES = {
+    # full name or first letter (S, A, O / A, I / A, U, R), like the menus and the GUI combo boxes
+    "brands": {"S": "SAMSUNG", "SAMSUNG": "SAMSUNG", "A": "APPLE", "APPLE": "APPLE", "O": "OTHER", "OTHER": "OTHER"},
+    "os_names": {"A": "ANDROID", "ANDROID": "ANDROID", "I": "IOS", "IOS": "IOS"},
+    "statuses": {"A": "ACTIVE", "ACTIVE": "ACTIVE", "U": "UNASSIGNED", "UNASSIGNED": "UNASSIGNED", "R": "RETIRED", "RETIRED": "RETIRED"},
+    "os_versions": {"13", "14", "15", "16", "17", "18", "26"},
+
+    # model pattern -> the OS it runs (None:  any OS)
+    "models": [
+        (re.compile(r"[SA]\d+|(?:FOLD|FLIP)\d+"), "ANDROID"),   # S22, A54, FOLD7, FLIP7
+        (re.compile(r"IPHONE\s+(?:\d+|SE)"), "IOS"),            # IPHONE 14, IPHONE SE
+        (re.compile(r"OTHER"), None)
+    ],
+
+    # brand -> the only OS it ships with (OTHER:  any OS)
+    "brand_os": {"SAMSUNG": "ANDROID", "APPLE": "IOS"},
+
+    # all workstation names start with "WS" or it is "UNASSIGNED"
+    "workstation": re.compile(r"WS.*|UNASSIGNED")
+}
+
+# error code -> message, see validatePhones
+VALIDATION_ERRORS = {
+    "required":             "{field} is required.",
+    "invalid_brand":        "Brand {value!r} is not valid.  Enter S for SAMSUNG, A for APPLE or O for OTHER.",
+    "invalid_model":        "Model {value!r} is not valid (neither Android nor iOS).",
+    "invalid_os":           "OS {value!r} is not valid.  Enter A for ANDROID and I for IOS.",
+    "invalid_os_version":   "OS {value!r} is invalid.  Please enter a number in {{13, 14, 15, 16, 17, 18, 26}}.",
+    "invalid_status":       "Status {value!r} is not valid.  Enter A for ACTIVE, U for UNASSIGNED and R for RETIRED.",
+    "invalid_workstation":  "Workstation {value!r} is not valid.  It has to start with WS.",
+    "brand_os_mismatch":    "{value} phones don't run {os}.",
+    "model_os_mismatch":    "Model {value} doesn't run {os}.",
+    "active_workstation":   "An ACTIVE phone needs a workstation (WS...), not {value!r}."
+}
+
+# every detail validatePhones checks, in table order
+VALIDATED_FIELDS = ["brand", "model", "os", "os_version", "serial_number", "imei", "status", "workstation"]
+
+
+# field names as the messages spell them
+FIELD_LABELS = {"os": "OS", "os_version": "OS version", "imei": "IMEI"}
+
+
+# one validation error:  {"field", "code", "message"}
+def validationError(field, code, value=None, **details):
+    label = FIELD_LABELS.get(field, field.replace("_", " ").capitalize())
+    return {"field": field, "code": code, "message": VALIDATION_ERRORS[code].format(field=label, value=value, **details)}
+
+
+# normalize one value through a lookup rule (brands, os_names, statuses); return (value, error)
+def lookupRule(field, value, rule, code):
+    if not value:
+        return None, validationError(field, "required")
+
+    normalized = PHONE_RULES[rule].get(value)
+    if normalized is None:
+        return None, validationError(field, code, value)
+
+    return normalized, None
+
+
+# check one record (already stripped and capitalized) field by field, then across fields
+def checkPhoneRecord(record, fields):
+    row = {}
+    errors = []
+
+    def check(field, result):
+        value, error = result
+        if error:
+            errors.append(error)
         else:
-            return None
-        
-    # FLIP or FOLD models
-    elif model.startswith(samsungPres[2]) or model.startswith(samsungPres[3]):
-        number = model[4:]  # FOLD7 -> FOLD, 7; FLIP7 -> FLIP, 7
-    
-        if number.isdigit():
-            return model
+            row[field] = value
+
+    for field in fields:
+        value = record.get(field, "")
+
+        if field == "brand":
+            check(field, lookupRule(field, value, "brands", "invalid_brand"))
+
+        elif field == "os":
+            check(field, lookupRule(field, value, "os_names", "invalid_os"))
+
+        elif field == "status":
+            check(field, lookupRule(field, value, "statuses", "invalid_status"))
+
+        elif field == "model":
+            if not value:
+                errors.append(validationError(field, "required"))
+            elif not any(pattern.fullmatch(value) for pattern, _ in PHONE_RULES["models"]):
+                errors.append(validationError(field, "invalid_model", value))
+            else:
+                row[field] = value
+
+        elif field == "os_version":
+            if not value:
+                errors.append(validationError(field, "required"))
+            elif value not in PHONE_RULES["os_versions"]:
+                errors.append(validationError(field, "invalid_os_version", value))
+            else:
+                row[field] = value
+
+        elif field == "workstation":
+            if not value:
+                errors.append(validationError(field, "required"))
+            elif not PHONE_RULES["workstation"].fullmatch(value):
+                errors.append(validationError(field, "invalid_workstation", value))
+            else:
+                row[field] = value
+
+        # serial number and IMEI:  required here, uniqueness is up to the database
+        elif not value:
+            errors.append(validationError(field, "required"))
+
         else:
-            return None
+            row[field] = value
+
+    # brand/OS compatibility:  an Android can't be an iOS phone and vice versa
+    osName = row.get("os")
+    if osName and "brand" in row and PHONE_RULES["brand_os"].get(row["brand"], osName) != osName:
+        errors.append(validationError("os", "brand_os_mismatch", row["brand"], os=osName))
+
+    if osName and "model" in row:
+        for pattern, modelOS in PHONE_RULES["models"]:
+            if pattern.fullmatch(row["model"]):
+                if modelOS and modelOS != osName:
+                    errors.append(validationError("os", "model_os_mismatch", row["model"], os=osName))
+                break
 
-    # validate iOS models
-    # -------------------
-    
-    iphoneParts = model.split()  # split 'IPHONE 14' into 'IPHONE' and '14' or more parts
+    # only an ACTIVE phone has a workstation:  the others are UNASSIGNED
+    if "status" in row and "workstation" in fields:
+        if row["status"] != "ACTIVE":
+            row["workstation"] = "UNASSIGNED"
+            errors = [error for error in errors if error["field"] != "workstation"]
+        elif row.get("workstation") == "UNASSIGNED":
+            errors.append(validationError("workstation", "active_workstation", row["workstation"]))
+
+    return row, errors
+
+
+# validate many phone records at once, without printing
+def validatePhones(records, fields=None):
+    """
+    Validate and normalize phone records:  a list of dicts, or a dict of column lists ({"brand": [...], ...}).
+    Only the given fields are checked (default VALIDATED_FIELDS); rules across fields need all of theirs.
+    Return:  a list with one (normalized details or None, [{"field", "code", "message"}, ...]) per record
+    """
+
+    fields = fields or VALIDATED_FIELDS
+
+    # column lists -> records
+    if isinstance(records, dict):
+        columns = list(records)
+        records = [dict(zip(columns, values)) for values in zip(*records.values())]
+
+    results = []
+    for record in records:
+        # strip and capitalize all phone details for uniformity, the same as capPhoneDetails
+        record = {field: str(record[field]).strip().upper() if record.get(field) is not None else "" for field in fields}
+
+        row, errors = checkPhoneRecord(record, fields)
+        results.append((None if errors else row, errors))
+
+    return results
+
+
+# Validation functions:
+# ---------------------
 
-    if len(iphoneParts) == 2 and iphoneParts[0] == 'IPHONE' and (iphoneParts[1].isdigit() or iphoneParts[1] == 'SE'):
-        return model  # valid iOS model
+# check one value with validatePhones and print what is wrong with it (for the menus); return the normalized value or None
+def validateOne(field, value):
+    row, errors = validatePhones([{field: value}], fields=[field])[0]
 
-    print("ERROR:  Model is not valid (neither Android nor iOS).")
-    return None
+    for error in errors:
+        print(f"ERROR:  {error['message']}")
+
+    return row[field] if row else None
+
+
+# validate the first letter of the brand entered and return SAMSUNG, APPLE, OTHER or None
+def validateBrand(brand=None):  # brand should be S, A, O
+    return validateOne("brand", brand)
+
+
+# validate the model and return model or the model or None
+def validateModel(model=None):
+    return validateOne("model", model)
 
 
 # validate and return ANDROID or IOS
 def validateOSName(os_name=None):
-    OS_NAMES = {'A': 'ANDROID', 'I': 'IOS'}
-    
-    if not os_name :
-        print("ERROR:  OS name is required.")
-        return False
-    
-    key = os_name.upper()
-    if key not in OS_NAMES:
-        print("ERROR:  Enter A for ANROID and I for IOS.")
-        return False
-    
-    return OS_NAMES[key]  # returns ANDROID or IOS
+    return validateOne("os", os_name) or False
 
 
 # validate the OS version
 def validateOSVersion(version=None):
-    VERSIONS = {13, 14, 15, 16, 17, 18, 26}
-    
-    if not version:
-        print("ERROR:  OS Version is required.")
-        return None
-    
-    if not version.isdigit():
-        print(f"ERROR:  OS {version} is invalid.  Please enter a number in {VERSIONS}.")
-        print("Please try again.")                   
-        return None         
+    version = validateOne("os_version", version)
+    return int(version) if version else None
 
-    version = int(version)  # convert to integer since it is NOT a string
-    if not version in VERSIONS:
-        print(f"ERROR:  OS {version} is invalid.  Please enter a number in {VERSIONS}.")
-        print("Please try again.")                   
-        return None 
-    
-    return version
+
+# validate that the brand and the model run the OS (an Android can't be an iOS phone and vice versa)
+def validateOSCompatibility(brand=None, model=None, os_name=None) -> bool:
+    _, errors = validatePhones([{"brand": brand, "model": model, "os": os_name}], fields=["brand", "model", "os"])[0]
+
+    for error in errors:
+        print(f"ERROR:  {error['message']}")
+
+    return not errors
 
 
 # validate the Serial Number, True: it exists in the database, False: it does not exist
-def validateSerialNumber(serial_number=None):
+def validateSerialNumber(serial_number=None, session=None):
     if not serial_number:
         print("ERROR:  Serial number is required.")
         return False
 
+    # in-memory uniqueness index, the database is only asked when it is turned off
+    if uniqueIndex.enabled:
+        return uniqueIndex.contains("serial_number", serial_number)
+
     # Check if the serial number already exists just to confirm with the phone ID
-    existing_phone = session.query(Phone).filter_by(serial_number=serial_number).first()
+    with transaction(session) as session:
+        existing_phone = (session.query(Phone).filter_by(serial_number=serial_number).first()
+                          or session.query(PhoneArchive).filter_by(serial_number=serial_number).first())
     
     if existing_phone:
         #print(f"LOG:  Serial number {serial_number} exists.")
@@ -260,13 +1065,19 @@ def validateSerialNumber(serial_number=None):
 
 
 # validate the IMEI to check if it already exists in the database
-def validateIMEI(imei=None):
+def validateIMEI(imei=None, session=None):
     if not imei:
         print("ERROR:  IMEI is required.")
         return False
 
+    # in-memory uniqueness index, the database is only asked when it is turned off
+    if uniqueIndex.enabled:
+        return uniqueIndex.contains("imei", imei)
+
     # Check if the IMEI already exists in the database
-    existing_phone = session.query(Phone).filter_by(imei=imei).first()
+    with transaction(session) as session:
+        existing_phone = (session.query(Phone).filter_by(imei=imei).first()
+                          or session.query(PhoneArchive).filter_by(imei=imei).first())
     
     if existing_phone:
         #print(f"ERROR:  IMEI {imei} already exists.")
@@ -277,41 +1088,16 @@ def validateIMEI(imei=None):
 
 # validate and return the STATUS of the phone
 def validateStatus(status=None):
-    STATUSES = {'A': 'ACTIVE', 'U': 'UNASSIGNED', 'R': 'RETIRED'}
-    
-    if not status:
-        print("ERROR:  Status is required.")
-        return None
-    
-    key = status.strip().upper()
-    if key not in STATUSES:
-        print("ERROR:  Enter A for Active, U for UNASSIGNED and R for RETIRED.")
-        return None
-    
-    return STATUSES[key]
+    return validateOne("status", status)
 
 
 # validate the workstation 
 def validateWorkstation(workstation=None) -> bool:
-    WS_PRE = ["WS", "UNASSIGNED"]  # all workstation names start with "WS" or it is "UNASSIGNED" initially
-    
-    if not workstation:
-        print("ERROR:  Workstation is required.")
-        return False
-       
-    # starts with "WS"
-    if workstation.startswith(WS_PRE[0]):
-        return True 
-
-    if workstation.upper() == WS_PRE[1]:
-        return True
-
-    # workstation doesn't start with "WS" nor is it "UNASSIGNED", thus it is invalid
-    return False  
+    return validateOne("workstation", workstation) is not None
     
 
 # Add a phone
-def addPhone(phone=None): 
+def addPhone(phone=None, session=None): 
     clearScreen()    
 
     # no phone was provided, run menu to get phone details
@@ -337,6 +1123,10 @@ def addPhone(phone=None):
                     print("LOG:  Please try again.")                  
                     continue
 
+                if not validateOSCompatibility(brandIn, modelIn, osNameIn):
+                    print("LOG:  Please try again.")                  
+                    continue
+
                 osVersionIn = input("OS Version (13, 14, 15, 16, 17, 18, 26): ").strip()
                 osVersionIn = validateOSVersion(osVersionIn)    
                 if not osVersionIn:
@@ -396,18 +1186,17 @@ def addPhone(phone=None):
         capPhoneDetails(phone)
         
         # add the phone to the database regardless if it was passed in or created through the menu        
-        session.add(phone)
-        session.commit()
+        with transaction(session) as s:
+            s.add(phone)
         print(f"INFO:  Phone {phone.brand} {phone.model} added successfully!")
     except Exception as e:
-        session.rollback()
         print(f"ERROR:  Couldn't add the phone:  {e}")
     
     input("Press Enter to continue ...")
 
 
 # delete a phone by its ID  
-def deletePhone(phoneID=None):
+def deletePhone(phoneID=None, session=None):
     """
     Delete a phone by ID, providedor prompted for.
     Return:  True for successful deletion, False otherwise
@@ -424,10 +1213,12 @@ def deletePhone(phoneID=None):
     
         # phoneID is an int
         phoneID = int(phoneID)
-        phone = session.query(Phone).filter_by(id=phoneID).first()
+        with transaction(session) as s:
+            phone = s.query(Phone).filter_by(id=phoneID).first()
+            if phone:
+                s.delete(phone)
+        
         if phone:
-            session.delete(phone)
-            session.commit()
             print(f"INFO: Phone with ID {phoneID} deleted successfully!")      
             input("Press Enter to continue ...")
             return True
@@ -446,356 +1237,559 @@ def deletePhone(phoneID=None):
     
         # phoneID is an int
         phoneID = int(phoneID)        
-        phone = session.query(Phone).filter_by(id=phoneID).first()      
-        if phone:
-            session.delete(phone)
-            session.commit()     
-            return True
+        with transaction(session) as s:
+            phone = s.query(Phone).filter_by(id=phoneID).first()      
+            if phone:
+                s.delete(phone)
         
-        return False
+        return bool(phone)
 
 
 # empty the "phone" database but keep the seeding
-def deleteAllPhones():
+def deleteAllPhones(session=None):
     """
     Delete all phones.
     Return:  Not Applicable
     """
     
-    session.query(Phone).delete() 
-    session.commit()
+    with transaction(session) as s:
+        s.query(Phone).delete() 
+
 
 # update a phone
-def updatePhone(phoneID=None):
+def updatePhone(phoneID=None, session=None):
     """
     Update a phone.
     Return:  Not Applicable
     """
     
-    clearScreen()
+    # one unit of work for the whole menu:  the phone stays attached until Save and Exit
+    with transaction(session) as session:
+        clearScreen()
 
-    #if not phoneID:
-        #print("ERROR: A phone ID was required.")
-        #time.sleep(2)
-        #return
+        #if not phoneID:
+            #print("ERROR: A phone ID was required.")
+            #time.sleep(2)
+            #return
 
-    # REF 1:  if this variable is False, commit is NOT needed (no details were updated)
-    commit = False
+        # REF 1:  if this variable is False, commit is NOT needed (no details were updated)
+        commit = False
     
-    phone = None
+        phone = None
     
-    # a phoneID is provided
-    if phoneID:
+        # a phoneID is provided
+        if phoneID:
     
-        # search for the phoneID and return the phone
-        phone = session.query(Phone).filter_by(id=phoneID).first()
+            # search for the phoneID and return the phone
+            phone = session.query(Phone).filter_by(id=phoneID).first()
     
-        if not phone:
-            print(f"ERROR: Phone ID {phoneID} not found.")
+            if not phone:
+                print(f"ERROR: Phone ID {phoneID} not found.")
+                input("Press Enter to continue ...")
+                return
+
+        # no phoneID is provided, prompt for it
+        phoneID = input("Enter a phone ID: ").strip()
+        if not int(phoneID):
+            print(f"ERROR:  Phone ID {phoneID} must be a number.")
             input("Press Enter to continue ...")
             return
 
-    # no phoneID is provided, prompt for it
-    phoneID = input("Enter a phone ID: ").strip()
-    if not int(phoneID):
-        print(f"ERROR:  Phone ID {phoneID} must be a number.")
-        input("Press Enter to continue ...")
-        return
-
-    # search for the phoneID and return the phone
-    phone = session.query(Phone).filter_by(id=phoneID).first()        
+        # search for the phoneID and return the phone
+        phone = session.query(Phone).filter_by(id=phoneID).first()        
 
 
-    # update functions, one per detail
-    # ############################################################################# #
+        # update functions, one per detail
+        # ############################################################################# #
 
-    def updateBrand():
-        val = input("Brand [Samsung, Apple, Other] (S, A, O, Enter): ").strip()
+        def updateBrand():
+            val = input("Brand [Samsung, Apple, Other] (S, A, O, Enter): ").strip()
         
-        if not val:
-            return 
+            if not val:
+                return 
         
-        new = validateBrand(val)
-        if new:
-            phone.brand = new
+            new = validateBrand(val)
+            if new:
+                phone.brand = new
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True
-        else:
-            print(f"ERROR: Invalid brand {new}.")
-            input("Press Enter to continue ...")
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True
+            else:
+                print(f"ERROR: Invalid brand {new}.")
+                input("Press Enter to continue ...")
 
-    def updateModel():      
-        val = input("Model (S22, iPhone 14, Enter): ").strip()
+        def updateModel():      
+            val = input("Model (S22, iPhone 14, Enter): ").strip()
         
-        if not val:          
-            return 
+            if not val:          
+                return 
         
-        new = validateModel(val)
-        if new:
-            phone.model = new.upper()
+            new = validateModel(val)
+            if new:
+                phone.model = new.upper()
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True            
-        else:
-            print(f"ERROR: Invalid model {new}.")
-            input("Press Enter to continue ...")
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True            
+            else:
+                print(f"ERROR: Invalid model {new}.")
+                input("Press Enter to continue ...")
 
-    def updateOS():        
-        val = input("OS [Android, iOS] (A, I, Enter): ").strip()
+        def updateOS():        
+            val = input("OS [Android, iOS] (A, I, Enter): ").strip()
         
-        if not val:
-            #print("LOG:  Enter was pressed.  Skipping OS.")
-            #time.sleep(2)            
-            return 
+            if not val:
+                #print("LOG:  Enter was pressed.  Skipping OS.")
+                #time.sleep(2)            
+                return 
         
-        new = validateOSName(val)
-        if new:
-            phone.os = new
+            new = validateOSName(val)
+            if new:
+                phone.os = new
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True            
-        else:
-            print(f"ERROR: Invalid OS {new}.")
-            input("Press Enter to continue ...")
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True            
+            else:
+                print(f"ERROR: Invalid OS {new}.")
+                input("Press Enter to continue ...")
 
-    def updateOSVersion():
-        val = input("OS Version (13, ..., 18, 26, Enter): ").strip()
+        def updateOSVersion():
+            val = input("OS Version (13, ..., 18, 26, Enter): ").strip()
         
-        # Enter was entered, skipping
-        if not val:        
-            return 
+            # Enter was entered, skipping
+            if not val:        
+                return 
         
-        # a non integer was entered
-        elif not val.isdigit():
-            print(f"ERROR:  OS {val} is invalid.  Please enter a number.")
-            input("Press Enter to continue ...")
-            return
+            # a non integer was entered
+            elif not val.isdigit():
+                print(f"ERROR:  OS {val} is invalid.  Please enter a number.")
+                input("Press Enter to continue ...")
+                return
             
-        val = int(val)  # a number (integer) was entered, convert it to an integer
-        new = validateOSVersion(val)
-        if new:          
-            phone.os_version = new  # new (OS) is an integer
+            val = int(val)  # a number (integer) was entered, convert it to an integer
+            new = validateOSVersion(val)
+            if new:          
+                phone.os_version = new  # new (OS) is an integer
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True            
-        else:
-            print(f"ERROR: Invalid OS version {new}.")
-            input("Press Enter to continue ...")            
-
-    def updateSerialNumber():
-        val = input("Serial Number (Enter to skip): ").strip()
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True            
+            else:
+                print(f"ERROR: Invalid OS version {new}.")
+                input("Press Enter to continue ...")            
+
+        def updateSerialNumber():
+            val = input("Serial Number (Enter to skip): ").strip()
         
-        if not val:     
-            return 
+            if not val:     
+                return 
         
-        #
-        # by unique = True and nullable = False, the serial number already exists in the database
-        #
+            #
+            # by unique = True and nullable = False, the serial number already exists in the database
+            #
         
-        # update it to allow for a change
-        phone.serial_number = val.upper()
+            # update it to allow for a change
+            phone.serial_number = val.upper()
             
-        nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-        commit = True            
+            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+            commit = True            
         
-    def updateIMEI():
-        val = input("IMEI (Enter to skip): ").strip()
+        def updateIMEI():
+            val = input("IMEI (Enter to skip): ").strip()
         
-        if not val:        
-            return 
+            if not val:        
+                return 
         
-        new = validateIMEI(val)
-        if not new:
-            phone.imei = val
+            new = validateIMEI(val)
+            if not new:
+                phone.imei = val
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True            
-        else:
-            print(f"ERROR: IMEI {new} already exists.")
-            input("Press Enter to continue ...")
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True            
+            else:
+                print(f"ERROR: IMEI {new} already exists.")
+                input("Press Enter to continue ...")
 
-    def updateStatus():
-        val = input("Status [ACTIVE, UNASSIGNED, RETIRED] (A, U, R, Enter): ").strip()
+        def updateStatus():
+            val = input("Status [ACTIVE, UNASSIGNED, RETIRED] (A, U, R, Enter): ").strip()
         
-        if not val:       
-            return 
+            if not val:       
+                return 
         
-        new = validateStatus(val)
-        if new:
-
-            if new == "ACTIVE":
-                print("INFO:  When status is ACTIVE, workstation must be assigned.")
-                ws = input("Enter workstation: ").strip().upper()
-
-                if validateWorkstation(ws):
-                    phone.workstation = ws
-                else:
-                    print(f"ERROR:  Invalid workstation {ws}. Update status aborted.")
-                    input("Press Enter to continue ...")
-                    return            
+            new = validateStatus(val)
+            if new:
+
+                if new == "ACTIVE":
+                    print("INFO:  When status is ACTIVE, workstation must be assigned.")
+                    ws = input("Enter workstation: ").strip().upper()
+
+                    if validateWorkstation(ws):
+                        phone.workstation = ws
+                    else:
+                        print(f"ERROR:  Invalid workstation {ws}. Update status aborted.")
+                        input("Press Enter to continue ...")
+                        return            
                         
-            if new in ["UNASSIGNED", "RETIRED"]:
-                phone.workstation = "UNASSIGNED"       
+                if new in ["UNASSIGNED", "RETIRED"]:
+                    phone.workstation = "UNASSIGNED"       
 
-            phone.status = new
+                phone.status = new
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True            
-        else:
-            print(f"ERROR: Invalid status {new}.")
-            input("Press Enter to continue ...")
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True            
+            else:
+                print(f"ERROR: Invalid status {new}.")
+                input("Press Enter to continue ...")
 
-    def updateWorkstation():
-        val = input("Workstation (Enter to skip): ").strip().upper()
+        def updateWorkstation():
+            val = input("Workstation (Enter to skip): ").strip().upper()
         
-        if not val:
-            return 
+            if not val:
+                return 
         
-        if validateWorkstation(val):
-            phone.workstation = val
+            if validateWorkstation(val):
+                phone.workstation = val
             
-            nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
-            commit = True            
-        else:
-            print(f"ERROR: Invalid workstation {val}.")
-            input("Press Enter to continue ...")
-
-    # save (commit) then exit
-    def saveExit():
-        if commit:
-            # REF 1:  commit because one or more phone details has been updated by the user
-            session.commit()
-            print(f"INFO: Phone ID {phone.id} was updated successfully!  Exiting ...")
-            input("Press Enter to continue ...")
-
-    # Menu Map
-    # ############################################################################# #
-
-    menuMap = {
-        "1": ("Brand", updateBrand),
-        "2": ("Model", updateModel),
-        "3": ("OS Name", updateOS),
-        "4": ("OS Version", updateOSVersion),
-        "5": ("Serial Number", updateSerialNumber),
-        "6": ("IMEI", updateIMEI),
-        "7": ("Status", updateStatus),
-        "8": ("Workstation", updateWorkstation),
-        "10": ("Save and Exit", saveExit)
-    }
+                nonlocal commit  # using nonlocal (in updatePhone scope) to update commit
+                commit = True            
+            else:
+                print(f"ERROR: Invalid workstation {val}.")
+                input("Press Enter to continue ...")
 
-    while True:
-        clearScreen()
-        print(f"Updating Phone ID : {phoneID}")
-        print("--------------------------------")
-        print(f"1.  Brand         : {phone.brand}")
-        print(f"2.  Model         : {phone.model}")
-        print(f"3.  OS Name       : {phone.os}")
-        print(f"4.  OS Version    : {phone.os_version}")
-        print(f"5.  Serial Number : {phone.serial_number}")
-        print(f"6.  IMEI          : {phone.imei}")
-        print(f"7.  Status        : {phone.status}")
-        print(f"8.  Workstation   : {phone.workstation}")
-        print("--------------------------------")
-        print("10.  Save and Exit")
-        print("--------------------------------")
+        # save (commit) then exit
+        def saveExit():
+            if commit:
+                # REF 1:  commit because one or more phone details has been updated by the user
+                session.commit()
+                print(f"INFO: Phone ID {phone.id} was updated successfully!  Exiting ...")
+                input("Press Enter to continue ...")
 
-        choice = input("Enter a choice [1-8, 10]: ").strip()
+        # Menu Map
+        # ############################################################################# #
+
+        menuMap = {
+            "1": ("Brand", updateBrand),
+            "2": ("Model", updateModel),
+            "3": ("OS Name", updateOS),
+            "4": ("OS Version", updateOSVersion),
+            "5": ("Serial Number", updateSerialNumber),
+            "6": ("IMEI", updateIMEI),
+            "7": ("Status", updateStatus),
+            "8": ("Workstation", updateWorkstation),
+            "10": ("Save and Exit", saveExit)
+        }
 
-        if choice in menuMap:
-            _, handler = menuMap[choice]
-            handler()
+        while True:
+            clearScreen()
+            print(f"Updating Phone ID : {phoneID}")
+            print("--------------------------------")
+            print(f"1.  Brand         : {phone.brand}")
+            print(f"2.  Model         : {phone.model}")
+            print(f"3.  OS Name       : {phone.os}")
+            print(f"4.  OS Version    : {phone.os_version}")
+            print(f"5.  Serial Number : {phone.serial_number}")
+            print(f"6.  IMEI          : {phone.imei}")
+            print(f"7.  Status        : {phone.status}")
+            print(f"8.  Workstation   : {phone.workstation}")
+            print("--------------------------------")
+            print("10.  Save and Exit")
+            print("--------------------------------")
+
+            choice = input("Enter a choice [1-8, 10]: ").strip()
+
+            if choice in menuMap:
+                _, handler = menuMap[choice]
+                handler()
             
-            if choice == "10":
-                break
-        else:
-            print(f"ERROR: Invalid choice {choice}.")
-            input("Press Enter to continue ...")
+                if choice == "10":
+                    break
+            else:
+                print(f"ERROR: Invalid choice {choice}.")
+                input("Press Enter to continue ...")
 
 
 # view a phone by its ID, IMEI, serial number or workstation
-def viewPhone(phoneID=None, imei=None, serialNumber=None, workstation=None):
-    clearScreen()
+def viewPhone(phoneID=None, imei=None, serialNumber=None, workstation=None, session=None):
+    # one unit of work for all the lookups of this menu
+    with transaction(session) as session:
+        clearScreen()
             
-    phone = None
-    if phoneID:
-        phone = session.query(Phone).filter_by(id=phoneID).first()
-    elif imei:
-        phone = session.query(Phone).filter_by(imei=imei).first()   
-    elif serialNumber:
-        phone = session.query(Phone).filter_by(serial_number=serialNumber).first()
-    elif workstation:
-        phone = session.query(Phone).filter_by(workstation=workstation).first()
-
-    if phone:
-        print(phone)
-        input("Press Enter to continue ...")
-        # let it flow to the CLI menu then can exit from there
-    else:
-        print("LOG:  Please try again.")                   
-        # let it flow to the CLI menu then can exit from there
+        phone = None
+        if phoneID:
+            phone = session.query(Phone).filter_by(id=phoneID).first()
+        elif imei:
+            phone = session.query(Phone).filter_by(imei=imei).first()   
+        elif serialNumber:
+            phone = session.query(Phone).filter_by(serial_number=serialNumber).first()
+        elif workstation:
+            phone = session.query(Phone).filter_by(workstation=workstation).first()
+
+        if phone:
+            print(phone)
+            input("Press Enter to continue ...")
+            # let it flow to the CLI menu then can exit from there
+        else:
+            print("LOG:  Please try again.")                   
+            # let it flow to the CLI menu then can exit from there
          
-    # search by menu
-    while True:
-        print("Search By:")
-        print("-----------------")
-        print("1. Phone ID: ")
-        print("2. IMEI: ")
-        print("3. Serial Number: ")
-        print("4. Exit")
-        print("-----------------")
+        # search by menu
+        while True:
+            print("Search By:")
+            print("-----------------")
+            print("1. Phone ID: ")
+            print("2. IMEI: ")
+            print("3. Serial Number: ")
+            print("4. Exit")
+            print("-----------------")
     
-        choice = input("Enter a number [1-4]:").strip()
+            choice = input("Enter a number [1-4]:").strip()
         
-        if choice == '4':
-            return
+            if choice == '4':
+                return
         
-        if choice == '1':
-            val = input("ID: ").strip().upper()
-            phone = session.query(Phone).filter_by(id=val).first()
+            if choice == '1':
+                val = input("ID: ").strip().upper()
+                phone = session.query(Phone).filter_by(id=val).first()
             
-            if phone:
-                print(phone)
-                input("Press Enter to continue ...")
-                break
+                if phone:
+                    print(phone)
+                    input("Press Enter to continue ...")
+                    break
             
-            else:  # the phone does not exist
-                print(f"ERROR: Phone not found by ID {val}.")
-                input("Press Enter to continue ...")                
-                continue
+                else:  # the phone does not exist
+                    print(f"ERROR: Phone not found by ID {val}.")
+                    input("Press Enter to continue ...")                
+                    continue
         
-        if choice == '2':
-            val = input("IMEI: ").strip().upper()            
-            phone = session.query(Phone).filter_by(imei=val).first()   
+            if choice == '2':
+                val = input("IMEI: ").strip().upper()            
+                phone = session.query(Phone).filter_by(imei=val).first()   
             
-            if phone:
-                print(phone)
-                input("Press Enter to continue ...")
-                break
+                if phone:
+                    print(phone)
+                    input("Press Enter to continue ...")
+                    break
             
-            else:  # the phone does not exist
-                print(f"ERROR: Phone not found by IMEI {val}.")
-                input("Press Enter to continue ...")                
-                continue
+                else:  # the phone does not exist
+                    print(f"ERROR: Phone not found by IMEI {val}.")
+                    input("Press Enter to continue ...")                
+                    continue
 
-        if choice == '3':
-            val = input("Serial Number: ").strip().upper()            
-            phone = session.query(Phone).filter_by(serial_number=val).first()
+            if choice == '3':
+                val = input("Serial Number: ").strip().upper()            
+                phone = session.query(Phone).filter_by(serial_number=val).first()
             
-            if phone:
-                print(phone)
-                input("Press Enter to continue ...")
-                break
+                if phone:
+                    print(phone)
+                    input("Press Enter to continue ...")
+                    break
             
-            else:  # the phone does not exist
-                print(f"ERROR: Phone not found by serial number {val}.")
-                input("Press Enter to continue ...")                
-                continue
+                else:  # the phone does not exist
+                    print(f"ERROR: Phone not found by serial number {val}.")
+                    input("Press Enter to continue ...")                
+                    continue
     
 
+# Paging:
+# -------
+
+# columns a page of phones can be filtered on (all of them are indexed), and prefix filters (an index range)
+PAGE_FILTERS = ["brand", "os", "os_version", "status", "workstation"]
+PAGE_PREFIX_FILTERS = {"workstation_prefix": "workstation"}
+
+# columns a page can be sorted by:  an index in (column, id) order, so the next page is still an index seek
+# (with a filter on another column, SQLite may use that column's index and sort the matching phones instead)
+PAGE_SORTS = ["id", "status", "workstation", "serial_number", "imei"]
+
+DEFAULT_PAGE_SIZE = 100
+
+
+# one page of phones with keyset (seek) pagination:  WHERE id > afterID ORDER BY id LIMIT limit
+def getPhonesPage(afterID=None, limit=DEFAULT_PAGE_SIZE, filters=None, order="asc", includeArchived=False,
+                  sort="id", fields=None):
+    """
+    Get one page of phones after the cursor afterID, optionally filtered by PAGE_FILTERS columns (and
+    PAGE_PREFIX_FILTERS prefixes) and sorted by one of PAGE_SORTS (then by id).
+    Every page is an index seek, so page 10,000 costs the same as page 1 (unlike OFFSET).
+    With includeArchived, phones in "phone_archive" are paged through too.
+    With fields (a list of PHONE_COLUMNS), only those columns are read.
+    Return:  (phones as PhoneRow tuples, or as dicts of fields, next cursor or None when this is the last page);
+             the cursor is an ID, or (sort value, ID) when sorted by another column (see encodeCursor)
+    """
+
+    # read-only:  Core rows straight into PhoneRow, no Session, no ORM instances
+    with getEngine().connect() as conn:
+        phones = pageRows(conn.execute(pageStatement(afterID, limit, filters, order, sort=sort, fields=fields)), fields)
+
+        if includeArchived:
+            archiveStmt = pageStatement(afterID, limit, filters, order, PhoneArchive, sort, fields)
+            phones = mergePages(phones, pageRows(conn.execute(archiveStmt), fields), limit, order, sort)
+
+    return splitPage(phones, limit, sort, fields)
+
+
+# the SELECT for one page, shared with the async data path (asyncphone.py)
+def pageStatement(afterID=None, limit=DEFAULT_PAGE_SIZE, filters=None, order="asc", model=Phone, sort="id", fields=None):
+    if order not in ["asc", "desc"]:
+        raise ValueError(f"Unknown order {order}.  Use asc or desc.")
+    if sort not in PAGE_SORTS:
+        raise ValueError(f"Can't sort phones by {sort}.  Use one of {PAGE_SORTS}.")
+
+    stmt = select(*[getattr(model, column) for column in pageColumns(fields, sort)])
+
+    for detail, value in (filters or {}).items():
+        if detail in PAGE_PREFIX_FILTERS:
+            # a range instead of LIKE 'prefix%':  LIKE is case-insensitive in SQLite and can't use the index
+            if value:
+                column = getattr(model, PAGE_PREFIX_FILTERS[detail])
+                stmt = stmt.where(column >= value, column < prefixEnd(value))
+        elif detail not in PAGE_FILTERS:
+            raise ValueError(f"Can't filter phones by {detail}.  Use one of {PAGE_FILTERS + list(PAGE_PREFIX_FILTERS)}.")
+        elif value is not None:
+            stmt = stmt.where(getattr(model, detail) == value)
+
+    # read one extra phone to know whether there is a next page
+    if afterID is None:
+        return orderPage(stmt, model, sort, order).limit(limit + 1)
+
+    parts = [orderPage(stmt.where(clause), model, sort, order).limit(limit + 1)
+             for clause in seekClauses(model, sort, order, afterID)]
+    if len(parts) == 1:
+        return parts[0]
+
+    # the page crosses from the NULL sort values to the others (or back):  two index seeks, each already in order
+    page = union_all(*[select(part.subquery()) for part in parts]).subquery()
+    return orderPage(select(page), page.c, sort, order).limit(limit + 1)
+
+
+# ORDER BY the sort column, then id (columns is the model or the .c of a subquery)
+def orderPage(stmt, columns, sort="id", order="asc"):
+    keys = [getattr(columns, sort)] if sort == "id" else [getattr(columns, sort), columns.id]
+    return stmt.order_by(*(keys if order == "asc" else [key.desc() for key in keys]))
+
+
+# the columns a page reads:  every column, or the requested fields plus id and the sort column the cursor is made of
+def pageColumns(fields=None, sort="id"):
+    if fields is None:
+        return PHONE_COLUMNS
+
+    unknown = [field for field in fields if field not in PHONE_COLUMNS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields {unknown}.  Use some of {PHONE_COLUMNS}.")
+
+    return list(dict.fromkeys([*fields, "id", sort]))
+
+
+# the smallest string after every string starting with prefix:  "WS10" -> "WS11"
+def prefixEnd(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+# WHERE for the phones after the cursor in (sort, id) order, one clause per index seek, in page order:
+# SQLite sorts NULL first, so a NULL sort value (a phone with no status) is before every other one going up
+# and after every other one going down, and a range on the column never includes it
+def seekClauses(model, sort, order, after):
+    if sort == "id":
+        return [model.id > after if order == "asc" else model.id < after]
+
+    column = getattr(model, sort)
+    value, afterID = after
+    if order == "asc":
+        if value is None:
+            return [and_(column.is_(None), model.id > afterID), column.is_not(None)]
+        return [tuple_(column, model.id) > tuple_(value, afterID)]
+
+    if value is None:
+        return [and_(column.is_(None), model.id < afterID)]
+    return [tuple_(column, model.id) < tuple_(value, afterID), column.is_(None)]
+
+
+# PhoneRow tuples from the rows of a pageStatement; the few distinct brands, models, OS names, versions and statuses
+# are interned so every phone shares one copy of each instead of holding its own strings
+def phoneRows(result):
+    intern = sys.intern
+    return [
+        PhoneRow(phoneID, intern(brand), intern(model), intern(osName), intern(osVersion), serial_number, imei,
+                 intern(status) if status else status, workstation)
+        for phoneID, brand, model, osName, osVersion, serial_number, imei, status, workstation in result.tuples().all()
+    ]
+
+
+# the rows of a pageStatement:  PhoneRow tuples for every column, else Core rows (attribute access like PhoneRow)
+def pageRows(result, fields=None):
+    return phoneRows(result) if fields is None else result.all()
+
+
+# the first limit + 1 phones of a hot and an archived page:  IDs are never reused, so one cursor covers both
+def mergePages(phones, archived, limit, order="asc", sort="id"):
+    if not archived:
+        return phones
+
+    merged = sorted([*phones, *archived], key=lambda phone: sortKey(phone, sort), reverse=(order == "desc"))
+    return merged[:limit + 1]
+
+
+# a phone's place in (sort, id) order, NULL first like SQLite
+def sortKey(phone, sort="id"):
+    if sort == "id":
+        return phone.id
+    value = getattr(phone, sort)
+    return (value is not None, value or "", phone.id)
+
+
+# the cursor to the phones after this one
+def pageCursor(phone, sort="id"):
+    return phone.id if sort == "id" else (getattr(phone, sort), phone.id)
+
+
+# (phones, next cursor) from the limit + 1 phones read by pageStatement; with fields, the phones as dicts of only those
+def splitPage(phones, limit, sort="id", fields=None):
+    nextCursor = None
+    if limit <= 0:
+        phones = []
+    elif len(phones) > limit:
+        phones = phones[:limit]
+        nextCursor = pageCursor(phones[-1], sort)
+
+    if fields is not None:
+        phones = [{field: getattr(phone, field) for field in fields} for phone in phones]
+
+    return phones, nextCursor
+
+
+# a cursor as text for a URL:  the ID as is, a (sort value, ID) cursor as URL-safe base64 of its JSON
+def encodeCursor(cursor):
+    if cursor is None or isinstance(cursor, int):
+        return cursor
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode().rstrip("=")
+
+
+# the cursor from encodeCursor's text, for a page sorted by sort
+def decodeCursor(text, sort="id"):
+    if text is None:
+        return None
+
+    try:
+        if sort == "id":
+            return int(text)
+        value, phoneID = json.loads(base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)))
+        if (value is not None and not isinstance(value, str)) or not isinstance(phoneID, int):
+            raise ValueError
+        return value, phoneID
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor {text} for a page sorted by {sort}.")
+
+
+# iterate over every matching phone, one page (one query) at a time
+def iterPhones(afterID=None, limit=DEFAULT_PAGE_SIZE, filters=None, order="asc", includeArchived=False, sort="id", fields=None):
+    while True:
+        phones, afterID = getPhonesPage(afterID, limit, filters, order, includeArchived, sort, fields)
+        yield from phones
+
+        if afterID is None:
+            return
+
+
 # View all phones in the database
 def viewPhones():
-    phones = session.query(Phone).all()
     
     # terminal mode by default
     if CLI:
@@ -803,7 +1797,7 @@ def viewPhones():
     
         print(f"Phones in the database \"{Phone.__tablename__}\":")
         print("-------------------------------")
-        for phone in phones:
+        for phone in iterPhones():
             status_str = "Active" if phone.status else "Inactive"
             print(f"Phone ID: {phone.id}, Brand: {phone.brand}, Model: {phone.model}, OS: {phone.os} {phone.os_version}, "
                   f"Serial Number: {phone.serial_number}, IMEI: {phone.imei}, Status: {status_str}, "
@@ -811,16 +1805,40 @@ def viewPhones():
         
         input("Press Enter to continue ...")
     else:
-        return phones  # return phones to PyQT6 GUI's show_view_all_phones
+        return list(iterPhones())  # return phones to PyQT6 GUI's show_view_all_phones
 
 
 # exit menu
 def exitMenu():
-    # close the session and exit
-    session.close()
+    # close the database connections (if any were opened) and exit
+    if dbEngine is not None:
+        dbEngine.dispose()
     sys.exit(0) 
 
 
+# JSON responses:
+# ---------------
+
+# the web front ends encode phones with orjson when it is installed (pip install orjson), else with the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# phones (PhoneRow tuples, plain row tuples or records) as dicts of the PHONE_COLUMNS, ready to encode
+def phoneDicts(phones):
+    return [phone if isinstance(phone, dict) else dict(zip(PHONE_COLUMNS, phone)) for phone in phones]
+
+
+# JSON bytes of content made of dicts, lists, strings and numbers:  what is read from the database needs no
+# validation, PHONE_COLUMNS already are the API's field names and types
+def dumpsJSON(content):
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
 # Utility functions:
 # ------------------
 
@@ -843,6 +1861,1453 @@ def capPhoneDetails(phone=None):
             setattr(phone, detail, value.upper())
 
 
+# Search:
+# -------
+
+# phone details covered by the full-text search index
+SEARCH_COLUMNS = ["brand", "model", "serial_number", "imei", "workstation"]
+
+# bm25 weight per SEARCH_COLUMNS column:  a hit in a serial number or IMEI ranks above a hit in the brand
+SEARCH_WEIGHTS = [1.0, 2.0, 5.0, 5.0, 3.0]
+
+
+# FTS5 trigram index over phone (substring matches of 3+ characters), kept in sync with it by triggers
+def createSearchIndex(targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+    columns = ", ".join(SEARCH_COLUMNS)
+    newValues = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    oldValues = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+
+    with targetEngine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'phone_fts'")).first()
+
+        conn.execute(text(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS phone_fts USING fts5(
+                {columns}, content='phone', content_rowid='id', tokenize='trigram'
+            )
+        """))
+
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS phone_fts_insert AFTER INSERT ON phone BEGIN
+                INSERT INTO phone_fts (rowid, {columns}) VALUES (new.id, {newValues});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS phone_fts_delete AFTER DELETE ON phone BEGIN
+                INSERT INTO phone_fts (phone_fts, rowid, {columns}) VALUES ('delete', old.id, {oldValues});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS phone_fts_update AFTER UPDATE OF {columns} ON phone BEGIN
+                INSERT INTO phone_fts (phone_fts, rowid, {columns}) VALUES ('delete', old.id, {oldValues});
+                INSERT INTO phone_fts (rowid, {columns}) VALUES (new.id, {newValues});
+            END
+        """))
+
+        # first time on an existing phones.db:  index the phones that are already there
+        if not exists:
+            conn.execute(text("INSERT INTO phone_fts (phone_fts) VALUES ('rebuild')"))
+
+
+# the ranked search SELECT, shared with the async data path; None when no term is long enough to search
+def searchStatement(query, limit=20):
+    # every term must match (AND), each one as a substring phrase; the trigram index needs 3+ characters
+    terms = [term for term in query.upper().split() if len(term) >= 3]
+    if not terms:
+        return None
+
+    match = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+
+    return text(f"""
+        SELECT phone.* FROM phone_fts JOIN phone ON phone.id = phone_fts.rowid
+        WHERE phone_fts MATCH :match
+        ORDER BY bm25(phone_fts, {weights}), phone.id
+        LIMIT :limit
+    """).bindparams(match=match, limit=limit)
+
+
+# search phones by any part of their brand, model, serial number, IMEI or workstation
+def searchPhones(query, limit=20):
+    """
+    Search phones, e.g. "FOLD", "1016" (IMEI or serial number suffix) or "WS10 S22"; terms need 3+ characters.
+    Return:  a list of phones as dicts, best match first
+    """
+
+    stmt = searchStatement(query, limit)
+    if stmt is None:
+        return []
+
+    with getEngine().connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(stmt)]
+
+
+# Fleet stats:
+# ------------
+
+# the summary tables and the "phone" columns that feed them
+STATS_TABLES = {
+    "phone_stats": ["status", "brand", "os", "os_version"],
+    "workstation_stats": ["workstation", "status"]
+}
+
+
+# triggers that add/subtract one phone to/from its groups on every insert, update and delete of "phone"
+def createStatsTriggers(targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+
+    with targetEngine.begin() as conn:
+        for table, columns in STATS_TABLES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"), {"name": f"{table}_insert"}
+            ).first()
+            if exists:
+                continue
+
+            names = ", ".join(columns)
+            watched = ", ".join(sorted(set(columns)))
+
+            # NULL details (old rows, raw inserts) are counted as '' so they still fall into one group
+            def values(row):
+                return ", ".join(f"coalesce({row}.{column}, '')" for column in columns)
+
+            def matches(row):
+                return " AND ".join(f"{column} = coalesce({row}.{column}, '')" for column in columns)
+
+            add = f"""
+                INSERT INTO {table} ({names}, count) VALUES ({values("new")}, 1)
+                ON CONFLICT ({names}) DO UPDATE SET count = count + 1;
+            """
+            subtract = f"""
+                UPDATE {table} SET count = count - 1 WHERE {matches("old")};
+                DELETE FROM {table} WHERE {matches("old")} AND count <= 0;
+            """
+
+            # a partial set of triggers can't be trusted:  start over
+            for suffix in ["insert", "delete", "update"]:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_{suffix}"))
+
+            conn.execute(text(f"CREATE TRIGGER {table}_insert AFTER INSERT ON phone BEGIN {add} END"))
+            conn.execute(text(f"CREATE TRIGGER {table}_delete AFTER DELETE ON phone BEGIN {subtract} END"))
+            conn.execute(text(f"CREATE TRIGGER {table}_update AFTER UPDATE OF {watched} ON phone BEGIN {subtract} {add} END"))
+
+            # new triggers:  count the phones that are already there
+            conn.execute(text(f"DELETE FROM {table}"))
+            conn.execute(text(f"""
+                INSERT INTO {table} ({names}, count)
+                SELECT {values("phone")}, COUNT(*) FROM phone GROUP BY {values("phone")}
+            """))
+
+
+# the SELECTs behind fleetStats, shared with the async data path
+def statsStatements():
+    return (
+        select(PhoneStats.status, PhoneStats.brand, PhoneStats.os, PhoneStats.os_version, PhoneStats.count)
+            .order_by(PhoneStats.status, PhoneStats.brand, PhoneStats.os, PhoneStats.os_version),
+        select(WorkstationStats.workstation, WorkstationStats.status, WorkstationStats.count)
+            .order_by(WorkstationStats.workstation, WorkstationStats.status)
+    )
+
+
+# build the fleetStats result from the rows of the two summary tables
+def summarizeStats(groupRows, workstationRows):
+    groups = [dict(row._mapping) for row in groupRows]
+
+    byStatus = {"ACTIVE": 0, "UNASSIGNED": 0, "RETIRED": 0}
+    for group in groups:
+        byStatus[group["status"]] = byStatus.get(group["status"], 0) + group["count"]
+
+    return {
+        "total": sum(byStatus.values()),
+        "by_status": byStatus,
+        "groups": groups,
+        "workstations": [dict(row._mapping) for row in workstationRows]
+    }
+
+
+# fleet totals from the summary tables:  O(groups) no matter how many phones there are
+def fleetStats():
+    """
+    Count phones by status, by (status, brand, OS, OS version) and by (workstation, status).
+    Return:  {"total": n, "by_status": {...}, "groups": [{...}, ...], "workstations": [{...}, ...]}
+    """
+
+    groupStmt, workstationStmt = statsStatements()
+
+    with getEngine().connect() as conn:
+        return summarizeStats(conn.execute(groupStmt).all(), conn.execute(workstationStmt).all())
+
+
+# Change feed:
+# ------------
+
+# changes kept in the log after compaction, see createChangeLog
+CHANGE_LOG_SIZE = int(os.environ.get("PHONE_CHANGE_LOG_SIZE", "100000"))
+
+# compaction runs every this many changes
+CHANGE_LOG_COMPACT_EVERY = 1000
+
+# most changes returned by one changesSince call
+DEFAULT_CHANGES_LIMIT = 1000
+
+
+# "phone_changes":  one row per insert, update (changed fields only) and delete (tombstone) of a phone,
+# written by triggers so every writer is covered (phone.py, Flask, FastAPI, imports, other processes).
+# It is not in Base.metadata:  initDB keeps it and logs a 'reset' so readers know to reload everything.
+def createChangeLog(targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+
+    with targetEngine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS phone_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone_id INTEGER,
+                op TEXT NOT NULL,
+                fields TEXT,
+                changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+            )
+        """))
+
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'phone_changes_insert'")
+        ).first()
+        if exists:
+            return
+
+        for suffix in ["insert", "delete", "update", "compact"]:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS phone_changes_{suffix}"))
+
+        columns = [column for column in PHONE_COLUMNS if column != "id"]
+        allFields = ", ".join(f"'{column}', new.{column}" for column in columns)
+        changedFields = " UNION ALL ".join(
+            f"SELECT '{column}' AS k, new.{column} AS v WHERE old.{column} IS NOT new.{column}" for column in columns
+        )
+        anyChanged = " OR ".join(f"old.{column} IS NOT new.{column}" for column in columns)
+
+        conn.execute(text(f"""
+            CREATE TRIGGER phone_changes_insert AFTER INSERT ON phone BEGIN
+                INSERT INTO phone_changes (phone_id, op, fields) VALUES (new.id, 'insert', json_object({allFields}));
+            END
+        """))
+        conn.execute(text("""
+            CREATE TRIGGER phone_changes_delete AFTER DELETE ON phone BEGIN
+                INSERT INTO phone_changes (phone_id, op) VALUES (old.id, 'delete');
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER phone_changes_update AFTER UPDATE ON phone WHEN {anyChanged} BEGIN
+                INSERT INTO phone_changes (phone_id, op, fields)
+                VALUES (new.id, 'update', (SELECT json_group_object(k, v) FROM ({changedFields})));
+            END
+        """))
+
+        # keep the log bounded:  drop all but the newest CHANGE_LOG_SIZE changes now and then
+        conn.execute(text(f"""
+            CREATE TRIGGER phone_changes_compact AFTER INSERT ON phone_changes
+            WHEN new.seq % {CHANGE_LOG_COMPACT_EVERY} = 0 BEGIN
+                DELETE FROM phone_changes WHERE seq <= new.seq - {CHANGE_LOG_SIZE};
+            END
+        """))
+
+
+# the SELECTs behind changesSince, shared with the async data path
+def changesStatements(since, limit):
+    return (
+        text("""
+            SELECT seq, phone_id, op, fields, changed_at FROM phone_changes
+            WHERE seq > :since ORDER BY seq LIMIT :limit
+        """).bindparams(since=since, limit=limit + 1),
+        text("""
+            SELECT (SELECT MIN(seq) FROM phone_changes),
+                   (SELECT seq FROM sqlite_sequence WHERE name = 'phone_changes')
+        """)
+    )
+
+
+# build the changesSince result from the change rows and the (oldest, newest) sequence numbers
+def summarizeChanges(since, limit, rows, bounds):
+    oldest, newest = bounds
+    newest = newest or 0
+
+    # the reader missed compacted changes, or holds a sequence number from another database
+    resync = since > newest or (oldest is not None and since < oldest - 1)
+
+    changes = []
+    for seq, phoneID, op, fields, changedAt in rows[:limit]:
+        changes.append({
+            "seq": seq,
+            "id": phoneID,
+            "op": op,
+            "fields": json.loads(fields) if fields else None,
+            "changed_at": changedAt
+        })
+        if op == "reset":
+            resync = True
+
+    return {
+        "changes": changes,
+        "last_seq": changes[-1]["seq"] if changes else min(since, newest),
+        "more": len(rows) > limit,
+        "resync": resync
+    }
+
+
+# pull only what changed since the sequence number the caller saw last
+def changesSince(seq=0, limit=DEFAULT_CHANGES_LIMIT):
+    """
+    Get the changes to phones after sequence number seq, oldest first.
+    Return:  {"changes": [{"seq", "id", "op", "fields", "changed_at"}, ...], "last_seq": n, "more": bool, "resync": bool}
+             op is insert, update (fields holds only what changed), delete (tombstone) or reset;
+             resync means the caller has to reload every phone and continue from last_seq
+    """
+
+    changesStmt, boundsStmt = changesStatements(seq, limit)
+
+    with getEngine().connect() as conn:
+        rows = conn.execute(changesStmt).all()
+        bounds = conn.execute(boundsStmt).one()
+
+    return summarizeChanges(seq, limit, rows, bounds)
+
+
+# Archive:
+# --------
+
+# RETIRED phones are moved to "phone_archive" this many days after they were retired
+ARCHIVE_AFTER_DAYS = float(os.environ.get("PHONE_ARCHIVE_AFTER_DAYS", "365"))
+
+# the current time the way the archive tables store it:  ISO 8601 UTC
+SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+
+# triggers that record when phones are retired, and keep serial numbers and IMEIs unique across "phone" and
+# "phone_archive".  (the archive can't live in an ATTACHed file:  triggers can't reference another database)
+def createArchiveTriggers(targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+
+    triggers = {
+        "phone_retired_insert": f"""
+            AFTER INSERT ON phone WHEN new.status = 'RETIRED' BEGIN
+                INSERT OR REPLACE INTO phone_retired (phone_id, retired_at) VALUES (new.id, {SQL_NOW});
+            END""",
+        "phone_retired_update": f"""
+            AFTER UPDATE OF status ON phone BEGIN
+                DELETE FROM phone_retired WHERE phone_id = old.id AND new.status IS NOT 'RETIRED';
+                INSERT OR IGNORE INTO phone_retired (phone_id, retired_at)
+                SELECT new.id, {SQL_NOW} WHERE new.status = 'RETIRED';
+            END""",
+        "phone_retired_delete": """
+            AFTER DELETE ON phone BEGIN
+                DELETE FROM phone_retired WHERE phone_id = old.id;
+            END""",
+        "phone_archive_unique_insert": """
+            BEFORE INSERT ON phone
+            WHEN EXISTS (SELECT 1 FROM phone_archive WHERE serial_number = new.serial_number OR imei = new.imei) BEGIN
+                SELECT RAISE(ABORT, 'UNIQUE constraint failed: the serial number or IMEI belongs to an archived phone');
+            END""",
+        "phone_archive_unique_update": """
+            BEFORE UPDATE OF serial_number, imei ON phone
+            WHEN EXISTS (SELECT 1 FROM phone_archive WHERE serial_number = new.serial_number OR imei = new.imei) BEGIN
+                SELECT RAISE(ABORT, 'UNIQUE constraint failed: the serial number or IMEI belongs to an archived phone');
+            END"""
+    }
+
+    with targetEngine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'phone_retired_insert'")
+        ).first()
+        if exists:
+            return
+
+        for name, body in triggers.items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+
+        # phones retired before the triggers existed:  their window starts now
+        conn.execute(text(f"""
+            INSERT OR IGNORE INTO phone_retired (phone_id, retired_at)
+            SELECT id, {SQL_NOW} FROM phone WHERE status = 'RETIRED'
+        """))
+
+
+# move phones RETIRED for more than days into "phone_archive", batchSize phones per transaction
+def archiveRetiredPhones(days=None, batchSize=None, targetEngine=None):
+    """
+    Archive phones that have been RETIRED for longer than days (default ARCHIVE_AFTER_DAYS).
+    Archived phones keep their IDs, serial numbers and IMEIs (still unique) and leave every default read.
+    Return:  the number of phones archived
+    """
+
+    days = ARCHIVE_AFTER_DAYS if days is None else days
+    # every batch is one IN list:  at most LOOKUP_CHUNK_SIZE IDs, under SQLite's bound variable limit (999 before 3.32)
+    batchSize = min(batchSize or LOOKUP_CHUNK_SIZE, LOOKUP_CHUNK_SIZE)
+    targetEngine = targetEngine or getEngine()
+    columns = ", ".join(PHONE_COLUMNS)
+    archived = 0
+
+    while True:
+        with targetEngine.begin() as conn:
+            ids = conn.execute(text(f"""
+                SELECT r.phone_id FROM phone_retired r JOIN phone p ON p.id = r.phone_id
+                WHERE p.status = 'RETIRED' AND r.retired_at <= strftime('%Y-%m-%dT%H:%M:%fZ', 'now', :window)
+                ORDER BY r.phone_id LIMIT :batchSize
+            """), {"window": f"-{days} days", "batchSize": batchSize}).scalars().all()
+
+            if not ids:
+                break
+
+            # batchSize IDs per IN list
+            params = {f"id{i}": phoneID for i, phoneID in enumerate(ids)}
+            idList = ", ".join(f":{name}" for name in params)
+
+            conn.execute(text(f"""
+                INSERT INTO phone_archive ({columns}, retired_at, archived_at)
+                SELECT {", ".join(f"p.{column}" for column in PHONE_COLUMNS)}, r.retired_at, {SQL_NOW}
+                FROM phone p JOIN phone_retired r ON r.phone_id = p.id
+                WHERE p.id IN ({idList})
+            """), params)
+            conn.execute(text(f"DELETE FROM phone WHERE id IN ({idList})"), params)
+
+        archived += len(ids)
+
+    # Core statements skip the session events:  caches and indexes start over
+    if archived and targetEngine is getEngine():
+        notifyPhoneChanges(None)
+
+    return archived
+
+
+# Conditional GET:
+# ----------------
+
+# validators for polling clients:  the list's ETag is the change feed's newest sequence number (every write to
+# "phone" adds a change), a phone's ETag is its own version in "phone_version" (bumped by triggers)
+
+
+# triggers that count every phone's versions and remember when it last changed
+def createVersionTriggers(targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+
+    triggers = {
+        "phone_version_insert": f"""
+            AFTER INSERT ON phone BEGIN
+                INSERT OR REPLACE INTO phone_version (phone_id, version, updated_at) VALUES (new.id, 1, {SQL_NOW});
+            END""",
+        "phone_version_update": f"""
+            AFTER UPDATE ON phone BEGIN
+                UPDATE phone_version SET version = version + 1, updated_at = {SQL_NOW} WHERE phone_id = new.id;
+            END""",
+        "phone_version_delete": """
+            AFTER DELETE ON phone BEGIN
+                DELETE FROM phone_version WHERE phone_id = old.id;
+            END"""
+    }
+
+    with targetEngine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'phone_version_insert'")
+        ).first()
+        if exists:
+            return
+
+        for name, body in triggers.items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+
+        # phones added before the triggers existed start at version 1, changed now
+        conn.execute(text(f"""
+            INSERT OR IGNORE INTO phone_version (phone_id, version, updated_at)
+            SELECT id, 1, {SQL_NOW} FROM phone
+        """))
+
+
+# the newest change (sequence number, when) and one phone's (version, when), shared with the async data path;
+# neither reads the phone rows
+def tableVersionStatement():
+    return text("SELECT seq, changed_at FROM phone_changes ORDER BY seq DESC LIMIT 1")
+
+
+def phoneVersionStatement(phoneID):
+    return select(PhoneVersion.version, PhoneVersion.updated_at).where(PhoneVersion.phone_id == phoneID)
+
+
+# the phone and its version in one read:  the ETag has to describe exactly the body it is sent with
+# (so not through the lookup cache, which may hold an older copy written by another process)
+def versionedPhoneStatement(phoneID):
+    columns = [getattr(Phone, column) for column in PHONE_COLUMNS]
+    return (
+        select(*columns, PhoneVersion.version, PhoneVersion.updated_at)
+        .join(PhoneVersion, PhoneVersion.phone_id == Phone.id)
+        .where(Phone.id == phoneID)
+    )
+
+
+# (record, version, updated_at) from a versionedPhoneStatement row
+def versionedRecord(row):
+    if row is None:
+        return None
+    *details, version, updatedAt = row
+    return dict(zip(PHONE_COLUMNS, details)), version, updatedAt
+
+
+# the version of the whole phone table
+def tableVersion():
+    """
+    Get the newest change to "phone" (any add, update, delete, archive or reset).
+    Return:  (sequence number, ISO 8601 UTC time of the change), (0, None) for a database that never changed
+    """
+
+    with getEngine().connect() as conn:
+        row = conn.execute(tableVersionStatement()).first()
+    return tuple(row) if row else (0, None)
+
+
+# the version of one phone
+def phoneVersion(phoneID):
+    """
+    Get the version of phone phoneID (1 when added, +1 per update).
+    Return:  (version, ISO 8601 UTC time of the last change), None if not found
+    """
+
+    with getEngine().connect() as conn:
+        row = conn.execute(phoneVersionStatement(phoneID)).first()
+    return tuple(row) if row else None
+
+
+# a phone with its version
+def getVersionedPhone(phoneID):
+    """
+    Get phone phoneID and its version from one read.
+    Return:  (the phone as a dict, version, ISO 8601 UTC time of the last change), None if not found
+    """
+
+    with getEngine().connect() as conn:
+        return versionedRecord(conn.execute(versionedPhoneStatement(phoneID)).first())
+
+
+# strong ETags:  one per table version for the lists, one per phone version
+def tableETag(seq):
+    return f'"phones-{seq}"'
+
+
+def phoneETag(phoneID, version):
+    return f'"phone-{phoneID}-{version}"'
+
+
+# ISO 8601 UTC (how the triggers store times) to whole seconds, the precision of HTTP dates
+def isoSeconds(isoTime):
+    return datetime.strptime(isoTime[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def httpDate(isoTime):
+    return format_datetime(isoSeconds(isoTime), usegmt=True)
+
+
+# the ETag, Last-Modified and Cache-Control headers of a response (no-cache:  keep it, but ask every time)
+def validatorHeaders(etag, isoTime=None):
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if isoTime:
+        headers["Last-Modified"] = httpDate(isoTime)
+    return headers
+
+
+# the client's copy is still current:  answer 304 Not Modified
+def notModified(etag, isoTime=None, ifNoneMatch=None, ifModifiedSince=None):
+    """
+    Check a conditional GET's If-None-Match (or, without it, If-Modified-Since) against the current validators.
+    Return:  True when the client already has this version
+    """
+
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if ifNoneMatch:
+        tags = [tag.strip() for tag in ifNoneMatch.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if ifModifiedSince and isoTime:
+        try:
+            since = parsedate_to_datetime(ifModifiedSince)
+        except (TypeError, ValueError):
+            return False
+        return since.tzinfo is not None and isoSeconds(isoTime) <= since
+
+    return False
+
+
+# Backup:
+# -------
+
+# pages copied per backup step (4 KB pages:  1024 pages = 4 MB), the lock is released between steps
+BACKUP_PAGES_PER_STEP = 1024
+
+# seconds the backup sleeps between steps so writers get the database
+BACKUP_SLEEP = 0.005
+
+# a backup restarts whenever another connection writes; after this many restarts it copies in one step
+# (in WAL mode that one step reads a snapshot and still doesn't block the writers)
+BACKUP_MAX_RESTARTS = 10
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+# copy the live database to dest with SQLite's online backup API, then check the copy
+def backup(dest, pagesPerStep=BACKUP_PAGES_PER_STEP, compress=None, sleep=BACKUP_SLEEP, targetEngine=None):
+    """
+    Back phones.db up to dest while the CLI, GUI, Flask and FastAPI keep reading and writing.
+    The copy is written (and gzipped) next to dest, verified with PRAGMA integrity_check and only then renamed to dest.
+    compress:  gzip the copy (default:  when dest ends with .gz)
+    Return:  {"dest", "pages", "bytes", "seconds", "mb_per_sec", "steps", "restarts", "compressed", "integrity"}
+    """
+
+    targetEngine = targetEngine or getEngine()
+    source = targetEngine.url.database
+    compress = dest.endswith(".gz") if compress is None else compress
+    partial = f"{dest}.partial"
+
+    progress = {"steps": 0, "restarts": 0, "remaining": None}
+
+    # called after every step, between steps no lock is held:  remaining going up means the backup started over
+    def onStep(status, remaining, total):
+        progress["steps"] += 1
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            progress["restarts"] += 1
+            if progress["restarts"] > BACKUP_MAX_RESTARTS:
+                raise BackupRestarted()
+        progress["remaining"] = remaining
+
+        # let the writers (and the other threads of this process) have a turn
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    start = time.perf_counter()
+    try:
+        sourceConn = sqlite3.connect(source, timeout=SQLITE_PRAGMAS["busy_timeout"] / 1000)
+        destConn = sqlite3.connect(partial)
+        try:
+            try:
+                sourceConn.backup(destConn, pages=pagesPerStep, progress=onStep)
+            except BackupRestarted:
+                sourceConn.backup(destConn, pages=-1)
+
+            # one self-contained file:  no -wal/-shm next to the copy
+            destConn.execute("PRAGMA journal_mode=DELETE")
+            pages = destConn.execute("PRAGMA page_count").fetchone()[0]
+            integrity = destConn.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            destConn.close()
+            sourceConn.close()
+
+        if integrity != "ok":
+            raise RuntimeError(f"Backup of {source} failed the integrity check:  {integrity}")
+
+        size = os.path.getsize(partial)
+        if compress:
+            # gzip next to dest too:  a crash or a full disk while compressing leaves the previous backup alone
+            with open(partial, "rb") as fin, gzip.open(f"{dest}.partial.gz", "wb", compresslevel=6) as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+            os.replace(f"{dest}.partial.gz", dest)
+        else:
+            os.replace(partial, dest)
+    finally:
+        # a failed backup (integrity, BUSY, I/O, ...) leaves nothing behind but dest as it was
+        for leftover in [partial, f"{dest}.partial.gz"]:
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    seconds = time.perf_counter() - start
+    return {
+        "dest": dest,
+        "pages": pages,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "mb_per_sec": round(size / 1e6 / seconds, 1) if seconds else None,
+        "steps": progress["steps"],
+        "restarts": progress["restarts"],
+        "compressed": compress,
+        "integrity": integrity
+    }
+
+
+# Writes for the web front ends:
+# ------------------------------
+
+# add a phone from a dict of details (capitalized like every other path), see asyncphone.addPhone
+def addPhoneRecord(details, session=None):
+    """
+    Add a phone.
+    Return:  the new phone as a dict; raises IntegrityError for a duplicate serial number or IMEI
+    """
+
+    phone = Phone(**details)
+    capPhoneDetails(phone)
+
+    with transaction(session) as session:
+        session.add(phone)
+        session.flush()
+        return phoneRecord(phone)
+
+
+# update some details of a phone, see asyncphone.updatePhone
+def updatePhoneRecord(phoneID, updates, session=None):
+    """
+    Update the given details of phone phoneID.
+    Return:  the updated phone as a dict, None if not found
+    """
+
+    with transaction(session) as session:
+        phone = session.get(Phone, phoneID)
+        if not phone:
+            return None
+
+        for detail, value in updates.items():
+            setattr(phone, detail, value)
+
+        capPhoneDetails(phone)
+        session.flush()
+        return phoneRecord(phone)
+
+
+# delete a phone by its ID, see asyncphone.deletePhone
+def deletePhoneRecord(phoneID, session=None):
+    """
+    Delete phone phoneID.
+    Return:  True for successful deletion, False if not found
+    """
+
+    with transaction(session) as session:
+        phone = session.get(Phone, phoneID)
+        if not phone:
+            return False
+
+        session.delete(phone)
+        return True
+
+
+# Group commit:
+# -------------
+
+# on:  Flask and FastAPI writes are queued and committed together (one fsync) by a background writer
+GROUP_COMMIT = os.environ.get("PHONE_GROUP_COMMIT", "off") == "on"
+
+# latency vs throughput:  a batch is committed GROUP_COMMIT_WAIT_MS after its first write or at GROUP_COMMIT_MAX_WRITES
+GROUP_COMMIT_WAIT_MS = float(os.environ.get("PHONE_GROUP_COMMIT_WAIT_MS", "2"))
+GROUP_COMMIT_MAX_WRITES = int(os.environ.get("PHONE_GROUP_COMMIT_MAX_WRITES", "64"))
+
+
+# one writer thread, one transaction per batch, one SAVEPOINT per write:  a duplicate IMEI fails only its own write
+class GroupCommitter:
+    def __init__(self, waitMS=None, maxWrites=None):
+        self.wait = (GROUP_COMMIT_WAIT_MS if waitMS is None else waitMS) / 1000
+        self.maxWrites = maxWrites or GROUP_COMMIT_MAX_WRITES
+        self.writes = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.batches = 0
+        self.committed = 0
+
+    # queue fn(*args, session=...) (addPhoneRecord, updatePhoneRecord, ...); the future resolves after the commit
+    def submit(self, fn, *args):
+        future = Future()
+        self.writes.put((future, fn, args))
+
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="phone-group-commit", daemon=True)
+                    self.thread.start()
+
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.writes.get()]
+            deadline = time.monotonic() + self.wait
+
+            while len(batch) < self.maxWrites:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.writes.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self.commitBatch(batch)
+
+    def commitBatch(self, batch):
+        results = []
+
+        try:
+            with Session(expire_on_commit=False) as session:
+                # a real BEGIN first:  otherwise the first SAVEPOINT opens the transaction and its RELEASE commits it
+                session.connection().exec_driver_sql("BEGIN")
+
+                for future, fn, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+
+                    changes = session.info.setdefault("phoneChanges", [])
+                    pending = len(changes)
+                    try:
+                        with session.begin_nested():
+                            results.append((future, fn(*args, session=session), None))
+                    except Exception as e:
+                        del changes[pending:]  # nothing of this write is announced
+                        results.append((future, None, e))
+
+                session.commit()
+
+        # the commit itself failed:  every write of the batch failed with it
+        except Exception as e:
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.committed += len(results)
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {"batches": self.batches, "writes": self.committed, "queued": self.writes.qsize()}
+
+
+groupCommitter = GroupCommitter()
+
+
+# run one write from a web front end:  queued for the next group commit, or in its own transaction
+def writePhone(fn, *args):
+    """
+    Run fn(*args) (addPhoneRecord, updatePhoneRecord or deletePhoneRecord) as one write.
+    Return:  what fn returns; raises what fn raises (IntegrityError for a duplicate, ...)
+    """
+
+    if GROUP_COMMIT:
+        return groupCommitter.submit(fn, *args).result()
+
+    return fn(*args)
+
+
+# Query stats:
+# ------------
+
+# on:  every engine created by createDBEngine (and asyncphone's) times its statements, see queryStats()
+QUERY_STATS = os.environ.get("PHONE_QUERY_STATS", "off") == "on"
+
+# statements slower than this are kept in the slow-query log with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.environ.get("PHONE_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = 200
+
+# upper bounds (ms) of the histogram buckets, the last bucket takes the rest
+QUERY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+# the caller of a statement:  the innermost functions of these files, e.g. "getPhoneRecord < getPhoneByWorkstation"
+QUERY_CALLER_FILES = ("phone.py", "asyncphone.py", "flaskphone.py", "fastapiphone.py", "gui2.py", "benchphone.py")
+QUERY_CALLER_DEPTH = 3
+
+
+# per (caller, statement):  count, time, rows and a latency histogram; one lock, the listeners do very little
+class QueryStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.statements = {}
+            self.slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+            self.since = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    def record(self, caller, statement, ms, rows):
+        key = (caller, statement)
+        bucket = next((i for i, bound in enumerate(QUERY_BUCKETS_MS) if ms <= bound), len(QUERY_BUCKETS_MS))
+
+        with self.lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = {"count": 0, "ms": 0.0, "max_ms": 0.0, "rows": 0,
+                                                "histogram": [0] * (len(QUERY_BUCKETS_MS) + 1)}
+            entry["count"] += 1
+            entry["ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["rows"] += rows
+            entry["histogram"][bucket] += 1
+
+    def recordSlow(self, slowQuery):
+        with self.lock:
+            self.slow.append(slowQuery)
+
+    def snapshot(self):
+        labels = [f"<={bound}" for bound in QUERY_BUCKETS_MS] + [f">{QUERY_BUCKETS_MS[-1]}"]
+
+        with self.lock:
+            statements = [
+                {
+                    "caller": caller,
+                    "statement": statement,
+                    "count": entry["count"],
+                    "total_ms": round(entry["ms"], 3),
+                    "mean_ms": round(entry["ms"] / entry["count"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                    "rows": entry["rows"],
+                    "histogram_ms": {label: n for label, n in zip(labels, entry["histogram"]) if n}
+                }
+                for (caller, statement), entry in self.statements.items()
+            ]
+            slow = list(self.slow)
+
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {"since": self.since, "slow_query_ms": SLOW_QUERY_MS, "statements": statements, "slow": slow}
+
+
+queryStatsStore = QueryStats()
+
+
+# code object -> is it one of this project's functions (asked for every frame of every statement)
+queryCallerCodes = {}
+
+
+# the functions of this project that run the statement (outside SQLAlchemy, contextlib, ...), innermost first
+def queryCaller():
+    callers = []
+    frame = sys._getframe(2)
+    glet = None
+
+    while frame is not None and len(callers) < QUERY_CALLER_DEPTH:
+        code = frame.f_code
+        ours = queryCallerCodes.get(code)
+        if ours is None:
+            ours = queryCallerCodes[code] = (os.path.basename(code.co_filename) in QUERY_CALLER_FILES
+                                             and code.co_name not in QUERY_STATS_FRAMES)
+        if ours:
+            callers.append(code.co_name)
+        frame = frame.f_back
+
+        # async:  SQLAlchemy runs the statement in a greenlet, the coroutines that awaited it are in its parent
+        if frame is None and "greenlet" in sys.modules:
+            glet = (glet or sys.modules["greenlet"].getcurrent()).parent
+            frame = glet.gr_frame if glet is not None else None
+
+    return " < ".join(callers) or "?"
+
+
+# time every statement of targetEngine (a sync engine, or an async engine's sync_engine)
+def instrumentEngine(targetEngine):
+    if event.contains(targetEngine, "before_cursor_execute", beforeQuery):
+        return targetEngine
+
+    event.listen(targetEngine, "before_cursor_execute", beforeQuery)
+    event.listen(targetEngine, "after_cursor_execute", afterQuery)
+    return targetEngine
+
+
+def beforeQuery(conn, cursor, statement, parameters, context, executemany):
+    conn.info["queryStart"] = (time.perf_counter(), queryCaller())
+
+
+# statement -> the statement on one line (SQLAlchemy caches its compiled statements:  a few hundred at most)
+QUERY_TEXTS_SIZE = 4096
+queryTexts = {}
+
+
+# SQLite counts rows for INSERT/UPDATE/DELETE only:  a SELECT's rows are fetched after this, so they count as 0
+# (and its time is the time to its first row, which is all of it for the indexed lookups)
+def afterQuery(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("queryStart", None)
+    if started is None:
+        return
+    start, caller = started
+    ms = (time.perf_counter() - start) * 1000
+
+    oneLine = queryTexts.get(statement)
+    if oneLine is None:
+        oneLine = " ".join(statement.split())
+        if len(queryTexts) < QUERY_TEXTS_SIZE:
+            queryTexts[statement] = oneLine
+    queryStatsStore.record(caller, oneLine, ms, max(cursor.rowcount, 0))
+
+    if ms >= SLOW_QUERY_MS:
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        queryStatsStore.recordSlow({
+            "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "ms": round(ms, 3),
+            "caller": caller,
+            "statement": oneLine,
+            "parameters": repr(parameters)[:500],
+            "plan": explainQuery(conn, statement, parameters)
+        })
+
+
+# EXPLAIN QUERY PLAN of a slow statement, on its connection's DBAPI cursor (so it isn't timed itself)
+def explainQuery(conn, statement, parameters):
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+        return []
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f"EXPLAIN failed:  {e}"]
+
+
+QUERY_STATS_FRAMES = {queryCaller.__name__, beforeQuery.__name__, afterQuery.__name__}
+
+
+# turn the stats on at runtime (they are on from the start with PHONE_QUERY_STATS=on)
+def enableQueryStats(targetEngine=None):
+    global QUERY_STATS
+    QUERY_STATS = True
+    return instrumentEngine(targetEngine or getEngine())
+
+
+# per-statement timings and the slow-query log
+def queryStats():
+    """
+    Get the timings of every statement run since the stats were last reset, slowest in total first.
+    rows are the rows inserted, updated or deleted (SQLite has no row count for a SELECT before it is fetched).
+    Return:  {"since", "slow_query_ms", "statements": [{"caller", "statement", "count", "total_ms", "mean_ms",
+             "max_ms", "rows", "histogram_ms"}, ...], "slow": [{"at", "ms", "caller", "statement", "parameters", "plan"}, ...]}
+    """
+
+    return queryStatsStore.snapshot()
+
+
+# start the stats over (e.g. before a benchmark)
+def resetQueryStats():
+    queryStatsStore.reset()
+
+
+# write queryStats() to a JSON file (or stdout for "-")
+def dumpQueryStats(path):
+    stats = queryStats()
+    if path == "-":
+        json.dump(stats, sys.stdout, indent=2)
+        return stats
+
+    with open(path, "w", encoding="utf-8") as fout:
+        json.dump(stats, fout, indent=2)
+    return stats
+
+
+# Bulk import:
+# ------------
+
+# the phone details a bulk import reads from each row (id is always assigned by the database)
+IMPORT_COLUMNS = ["brand", "model", "os", "os_version", "serial_number", "imei", "status", "workstation"]
+
+
+# read phones one row at a time from a CSV or NDJSON file (a path or an open text file), yield (row number, dict)
+def readImportRows(source, fmt=None):
+    if isinstance(source, str):
+        fmt = fmt or ("csv" if source.lower().endswith(".csv") else "ndjson")
+        with open(source, newline="", encoding="utf-8") as f:
+            yield from readImportRows(f, fmt)
+        return
+
+    fmt = (fmt or "csv").lower()
+
+    if fmt == "csv":
+        # row 1 is the header
+        for rowNumber, record in enumerate(csv.DictReader(source), start=2):
+            yield rowNumber, record
+
+    elif fmt in ["ndjson", "jsonl"]:
+        for rowNumber, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield rowNumber, json.loads(line)
+            except ValueError as e:
+                yield rowNumber, {"_error": f"invalid JSON: {e}"}
+
+    else:
+        raise ValueError(f"Unknown import format {fmt}.  Use csv or ndjson.")
+
+
+# normalize and validate one imported row the way addPhone does; return (phone details, None) or (None, error)
+def validateImportRow(record):
+    if "_error" in record:
+        return None, record["_error"]
+
+    # a missing status means UNASSIGNED, like the Phone default
+    if not str(record.get("status") or "").strip():
+        record = dict(record, status="UNASSIGNED")
+
+    row, errors = validatePhones([record])[0]
+    if errors:
+        return None, "; ".join(f"{error['code']}: {error['message']}" for error in errors)
+
+    return row, None
+
+
+# insert one chunk of validated phones in a single transaction; return the rows that were rejected as duplicates
+def insertImportChunk(chunk, targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+    errors = []
+
+    # duplicates against the database:  one set-based query for the whole chunk
+    serials = [row["serial_number"] for _, row in chunk]
+    imeis = [row["imei"] for _, row in chunk]
+
+    with targetEngine.begin() as conn:
+        existing = conn.execute(
+            select(Phone.serial_number, Phone.imei)
+            .where(Phone.serial_number.in_(serials) | Phone.imei.in_(imeis))
+            .union_all(
+                select(PhoneArchive.serial_number, PhoneArchive.imei)
+                .where(PhoneArchive.serial_number.in_(serials) | PhoneArchive.imei.in_(imeis))
+            )
+        ).all()
+        existingSerials = {serial for serial, _ in existing}
+        existingIMEIs = {imei for _, imei in existing}
+
+        rows = []
+        for rowNumber, row in chunk:
+            if row["serial_number"] in existingSerials:
+                errors.append({"row": rowNumber, "error": f"serial number {row['serial_number']} already exists"})
+            elif row["imei"] in existingIMEIs:
+                errors.append({"row": rowNumber, "error": f"IMEI {row['imei']} already exists"})
+            else:
+                rows.append(row)
+
+        # executemany for the whole chunk
+        if rows:
+            conn.execute(Phone.__table__.insert(), rows)
+
+    # Core inserts skip the session events, so announce them here
+    if rows and targetEngine is getEngine():
+        notifyPhoneChanges([("insert", None, row) for row in rows])
+
+    return len(rows), errors
+
+
+# stream phones from a CSV/NDJSON file into the database in batches; return a report with per-row errors
+def importPhones(source, fmt=None, batchSize=500, targetEngine=None):
+    """
+    Import phones from a CSV or NDJSON file, batchSize phones per transaction.
+    Return:  {"inserted": count, "errors": [{"row": row number, "error": message}, ...]}
+    """
+
+    report = {"inserted": 0, "errors": []}
+
+    # serial numbers and IMEIs seen earlier in this file
+    seenSerials = set()
+    seenIMEIs = set()
+
+    chunk = []
+
+    def flush():
+        try:
+            inserted, errors = insertImportChunk(chunk, targetEngine)
+        except IntegrityError:
+            # another writer added a conflicting phone after the duplicate check, retry one phone at a time
+            inserted, errors = 0, []
+            for item in chunk:
+                try:
+                    n, rowErrors = insertImportChunk([item], targetEngine)
+                    inserted += n
+                    errors += rowErrors
+                except IntegrityError as e:
+                    errors.append({"row": item[0], "error": str(e.orig)})
+
+        report["inserted"] += inserted
+        report["errors"] += errors
+        chunk.clear()
+
+    for rowNumber, record in readImportRows(source, fmt):
+        row, error = validateImportRow(record)
+
+        if not error:
+            if row["serial_number"] in seenSerials:
+                error = f"serial number {row['serial_number']} is repeated in the file"
+            elif row["imei"] in seenIMEIs:
+                error = f"IMEI {row['imei']} is repeated in the file"
+
+        if error:
+            report["errors"].append({"row": rowNumber, "error": error})
+            continue
+
+        seenSerials.add(row["serial_number"])
+        seenIMEIs.add(row["imei"])
+        chunk.append((rowNumber, row))
+
+        if len(chunk) >= batchSize:
+            flush()
+
+    if chunk:
+        flush()
+
+    report["errors"].sort(key=lambda error: error["row"])
+    return report
+
+
+# Bulk export:
+# ------------
+
+# every column of the "phone" table, in table order
+EXPORT_COLUMNS = PHONE_COLUMNS
+
+EXPORT_FORMATS = ["csv", "ndjson", "jsonl", "json"]
+
+
+# the format in lower case, checked before anything is read or written
+def exportFormat(fmt):
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}.  Use csv, ndjson or json.")
+    return fmt
+
+
+# yield all phones as plain tuples, fetching batchSize rows at a time (no ORM objects, constant memory)
+def iterPhoneRows(batchSize=1000, targetEngine=None):
+    targetEngine = targetEngine or getEngine()
+    table = Phone.__table__
+    
+    stmt = table.select().with_only_columns(*[table.c[column] for column in EXPORT_COLUMNS]).order_by(table.c.id)
+
+    with targetEngine.connect() as conn:
+        result = conn.execution_options(yield_per=batchSize).execute(stmt)
+        for partition in result.partitions():
+            yield from partition
+
+
+# yield the whole fleet as CSV, NDJSON or JSON text, one chunk per batch of rows
+def iterExport(fmt="csv", batchSize=1000, targetEngine=None):
+    fmt = exportFormat(fmt)
+    
+    rows = iterPhoneRows(batchSize, targetEngine)
+    
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        
+        for n, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if n % batchSize == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue()
+        return
+
+    # NDJSON is one object per line, JSON is the same objects separated by commas inside one array
+    def encode(chunk, first):
+        if fmt == "json":
+            return ("" if first else ",\n") + ",\n".join(chunk)
+        return "\n".join(chunk) + "\n"
+
+    if fmt == "json":
+        yield "["
+
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(EXPORT_COLUMNS, row))))
+        if len(chunk) >= batchSize:
+            yield encode(chunk, first)
+            chunk = []
+            first = False
+
+    if chunk:
+        yield encode(chunk, first)
+
+    if fmt == "json":
+        yield "]\n"
+
+
+# export the whole fleet to a file (or stdout for "-") without loading it into memory
+def exportPhones(dest, fmt=None, batchSize=1000, targetEngine=None):
+    """
+    Export all phones as CSV, NDJSON or JSON; the format defaults to the file extension.
+    Return:  Not Applicable
+    """
+
+    if not fmt:
+        fmt = os.path.splitext(dest)[1].lstrip(".") if dest != "-" else "csv"
+
+    # iterExport checks too, but only once it runs:  after open() has already emptied dest
+    fmt = exportFormat(fmt)
+
+    if dest == "-":
+        for text in iterExport(fmt, batchSize, targetEngine):
+            sys.stdout.write(text)
+        return
+
+    with open(dest, "w", newline="", encoding="utf-8") as f:
+        for text in iterExport(fmt, batchSize, targetEngine):
+            f.write(text)
+
+
+# Fleet snapshot:
+# ---------------
+
+# the whole fleet as ready-to-send JSON bytes (and gzip / brotli copies) for GET /phones/all:  built on the first
+# request, then rebuilt in the background SNAPSHOT_DEBOUNCE seconds after the last write (at most SNAPSHOT_MAX_DELAY
+# after the first one), so a burst of writes costs one rebuild
+SNAPSHOT_DEBOUNCE = float(os.environ.get("PHONE_SNAPSHOT_DEBOUNCE", "0.5"))
+SNAPSHOT_MAX_DELAY = float(os.environ.get("PHONE_SNAPSHOT_MAX_DELAY", "5"))
+
+# one build:  the table version it was read at, encoding -> body ("identity" is the plain JSON), its size and cost
+Snapshot = namedtuple("Snapshot", ["seq", "changed_at", "bodies", "phones", "seconds"])
+
+
+class PhoneSnapshot:
+    def __init__(self, debounce=None, maxDelay=None):
+        self.debounce = SNAPSHOT_DEBOUNCE if debounce is None else debounce
+        self.maxDelay = SNAPSHOT_MAX_DELAY if maxDelay is None else maxDelay
+        self.snapshot = None
+        self.buildLock = threading.Lock()
+        self.dirty = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pending = False  # a rebuild is scheduled
+        self.builds = 0
+
+    # the current snapshot, built now if there is none yet (the caller waits for the first build only)
+    def current(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.buildLock:
+                if self.snapshot is None:
+                    self.build()
+            snapshot = self.snapshot
+        return snapshot
+
+    def rebuild(self):
+        with self.buildLock:
+            return self.build()
+
+    # read the fleet and encode it; the version is read first:  the body is never older than its ETag says
+    def build(self):
+        start = time.perf_counter()
+        seq, changedAt = tableVersion()
+
+        phones = phoneDicts(iterPhoneRows(5000))
+        body = dumpsJSON(phones)
+        count = len(phones)
+        del phones
+
+        bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+        try:
+            import brotli  # optional:  pip install brotli
+            bodies["br"] = brotli.compress(body, quality=5)
+        except ImportError:
+            pass
+
+        self.snapshot = Snapshot(seq, changedAt, bodies, count, round(time.perf_counter() - start, 3))
+        self.builds += 1
+        return self.snapshot
+
+    # a write happened (or another process wrote):  rebuild soon, once the writes stop
+    def schedule(self):
+        if self.snapshot is None:
+            return  # nobody asked for one yet
+
+        self.pending = True
+        self.dirty.set()
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="phone-snapshot", daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        while True:
+            self.dirty.wait()
+            first = time.monotonic()
+
+            # wait until no write came for one debounce period, or for the maximum delay
+            while True:
+                self.dirty.clear()
+                time.sleep(self.debounce)
+                if not self.dirty.is_set() or time.monotonic() - first >= self.maxDelay:
+                    break
+
+            self.pending = False
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"ERROR:  Rebuilding the phone snapshot failed:  {e}")
+
+    # the snapshot is for table version seq or older:  rebuild it when the table moved on (writes of other processes);
+    # unlike a write, a poll doesn't push a scheduled rebuild back
+    def checkVersion(self, seq):
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.seq != seq and not self.pending:
+            self.schedule()
+
+    # phoneListeners callback:  every commit in this process; None (initDB, another engine) drops the snapshot
+    def onPhoneChanges(self, changes):
+        if changes is None:
+            self.snapshot = None
+            return
+        self.schedule()
+
+    def stats(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            return {"builds": self.builds}
+        return {
+            "builds": self.builds,
+            "seq": snapshot.seq,
+            "phones": snapshot.phones,
+            "build_seconds": snapshot.seconds,
+            "bytes": {encoding: len(body) for encoding, body in snapshot.bodies.items()}
+        }
+
+
+phoneSnapshot = PhoneSnapshot()
+phoneListeners.append(phoneSnapshot.onPhoneChanges)
+
+
+# the body for a request's Accept-Encoding:  brotli, then gzip, then plain JSON
+def snapshotBody(snapshot, acceptEncoding=None):
+    """
+    Pick the smallest encoding of the snapshot the client accepts.
+    Return:  (encoding, body bytes, strong ETag of that encoding)
+    """
+
+    accepted = acceptedEncodings(acceptEncoding)
+    for encoding in ["br", "gzip"]:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0 and encoding in snapshot.bodies:
+            return encoding, snapshot.bodies[encoding], f'"phones-all-{snapshot.seq}-{encoding}"'
+
+    return "identity", snapshot.bodies["identity"], f'"phones-all-{snapshot.seq}"'
+
+
+# {encoding: q} of an Accept-Encoding header:  "gzip;q=0, identity" refuses gzip (RFC 9110 12.5.3), a missing q is 1
+def acceptedEncodings(acceptEncoding):
+    accepted = {}
+    for part in (acceptEncoding or "").split(","):
+        encoding, *params = [item.strip() for item in part.split(";")]
+        if not encoding:
+            continue
+
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[encoding.lower()] = q
+
+    return accepted
+
+
 # seed the phones for testing
 def seedTestPhones():
     a = Phone(
@@ -967,9 +3432,67 @@ def seedTestPhones():
     addPhone(j)    
     
 
+# CLI subcommands:
+# ----------------
+
+# python phone.py import phones.csv [batchSize]
+def importCommand(path, batchSize="500"):
+    migrateDB()
+    
+    report = importPhones(path, batchSize=int(batchSize))
+    
+    for error in report["errors"]:
+        print(f"ERROR:  Row {error['row']}: {error['error']}")
+    print(f"INFO:  {report['inserted']} phones imported, {len(report['errors'])} rows rejected.")
+
+
+# python phone.py archive [days] [batchSize]
+def archiveCommand(days=None, batchSize=None):
+    migrateDB()
+
+    days = ARCHIVE_AFTER_DAYS if days is None else float(days)
+    archived = archiveRetiredPhones(days, int(batchSize) if batchSize else None)
+    print(f"INFO:  {archived} phones RETIRED for more than {days:g} days archived.")
+
+
+# python phone.py backup phones-backup.db[.gz] [pagesPerStep]
+def backupCommand(dest, pagesPerStep=str(BACKUP_PAGES_PER_STEP)):
+    result = backup(dest, int(pagesPerStep))
+
+    print(f"INFO:  {result['pages']} pages ({result['bytes'] / 1e6:.1f} MB) backed up to {dest} in {result['seconds']} s "
+          f"({result['mb_per_sec']} MB/s, {result['steps']} steps, {result['restarts']} restarts), "
+          f"integrity_check:  {result['integrity']}")
+
+
+# python phone.py export phones.csv [csv | ndjson | json]
+def exportCommand(path, fmt=None):
+    migrateDB()
+    exportPhones(path, fmt)
+
+
+COMMANDS = {
+    "import": ("python phone.py import <file.csv | file.ndjson> [batchSize]", importCommand),
+    "export": ("python phone.py export <file | -> [csv | ndjson | json]", exportCommand),
+    "archive": ("python phone.py archive [days] [batchSize]", archiveCommand),
+    "backup": ("python phone.py backup <file.db | file.db.gz> [pagesPerStep]", backupCommand)
+}
+
+
 # main
 if __name__ == "__main__":
 
+    # a subcommand was given:  run it against the existing database (no drop, no seeding) and exit
+    if len(sys.argv) > 1:
+        if sys.argv[1] not in COMMANDS:
+            print("Usage:")
+            for usage, _ in COMMANDS.values():
+                print(f"  {usage}")
+            sys.exit(1)
+        
+        _, command = COMMANDS[sys.argv[1]]
+        command(*sys.argv[2:])
+        sys.exit(0)
+
     # init the DB
     initDB()
     